@@ -2,16 +2,30 @@
 
 import os
 import re
+import gzip
+import json
+import time
+import base64
 import random
+import hashlib
+import mimetypes
+import itertools
+import sqlite3
+import threading
+import queue
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import yt_dlp
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 from urllib.parse import urlparse
 
 from flask import (
     Flask, render_template, request, session, redirect,
-    url_for, flash, jsonify, abort, Response
+    url_for, flash, jsonify, abort, Response, send_from_directory, g, has_request_context
 )
+from flask.json.provider import DefaultJSONProvider
 from flask_jwt_extended import (
     JWTManager,
     create_access_token,
@@ -20,25 +34,118 @@ from flask_jwt_extended import (
     verify_jwt_in_request,
 )
 from flask_sqlalchemy import SQLAlchemy
+import click
 from flask_cors import CORS
-from sqlalchemy import func, text
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func, text, tuple_, inspect, create_engine as sa_create_engine, event as sa_event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson  # optional, faster JSON encoding for API responses
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # optional, Content-Encoding: br on top of gzip
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
-CORS(app, origins=["*"])
+CORS(app, origins=["*"], expose_headers=['X-Next-Cursor', 'X-Latest-Cursor', 'X-More-Newer', 'ETag'])
 
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'earshot-secret-key-2025')
 app.config['JWT_SECRET_KEY'] = 'earshot-mobile-secret-2025'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider with orjson doing the encoding. Non-ASCII is emitted as UTF-8 rather than \\u escapes."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+if orjson is not None and os.environ.get('JSON_ENCODER', 'orjson') == 'orjson':
+    app.json = OrjsonProvider(app)
+
 # ---------- DATABASE ----------
-db_uri = (
+db_url = make_url(
     os.environ.get('DATABASE_URL', 'sqlite:///earshot.db')
     .replace('postgres://', 'postgresql+psycopg://', 1)
     .replace('postgresql://', 'postgresql+psycopg://', 1)
-    + '?client_encoding=utf8'
 )
+
+# Pool sizing: gunicorn threads and JOB_CONCURRENCY job threads each hold a
+# connection while they work, so the pool should cover both per process.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds; under typical server idle timeouts
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))  # Postgres; 0 disables
+
+# Applied to every SQLite connection (see sqlite_pragmas). WAL lets readers
+# run alongside the single writer, and busy_timeout makes a writer wait for
+# the lock instead of failing with "database is locked".
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+if SQLITE_JOURNAL_MODE not in ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF'):
+    raise ValueError(f'Unsupported SQLITE_JOURNAL_MODE: {SQLITE_JOURNAL_MODE}')
+if SQLITE_SYNCHRONOUS not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+    raise ValueError(f'Unsupported SQLITE_SYNCHRONOUS: {SQLITE_SYNCHRONOUS}')
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for url: pool settings, plus the statement timeout on Postgres."""
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}  # in-memory databases use a single shared connection, not a sized pool
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+    if url.get_backend_name() == 'postgresql' and DB_STATEMENT_TIMEOUT_MS:
+        options['connect_args'] = {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'}
+    return options
+
+def lift_statement_timeout():
+    """
+    Turn the statement timeout off for the rest of the session's transaction
+    (SET LOCAL), for bulk rewrites that may rightly run longer than a request.
+    """
+    if db.engine.dialect.name == 'postgresql' and DB_STATEMENT_TIMEOUT_MS:
+        db.session.execute(text('SET LOCAL statement_timeout = 0'))
+
+@sa_event.listens_for(Engine, 'connect')
+def sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune each new SQLite connection; other drivers are left alone."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}')
+    cursor.execute(f'PRAGMA synchronous = {SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+    cursor.close()
+
+if db_url.get_backend_name() == 'postgresql':
+    db_url = db_url.update_query_dict({'client_encoding': 'utf8'})
+db_uri = db_url.render_as_string(hide_password=False)
 app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(db_url)
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
 
@@ -47,7 +154,9 @@ jwt = JWTManager(app)
 follow = db.Table(
     'follow',
     db.Column('follower_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    # The PK leads with follower_id; lookups by followed account (followers, fan-out) need their own index
+    db.Index('ix_follow_followed_id', 'followed_id'),
 )
 
 # Define crate table (many-to-many between users and posts)
@@ -55,7 +164,18 @@ crate = db.Table(
     'crate',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
     db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True),
-    db.Column('saved_at', db.DateTime, default=datetime.utcnow)
+    db.Column('saved_at', db.DateTime, default=datetime.utcnow),
+    # The PK leads with user_id, so per-post lookups and a user's newest saves need these
+    db.Index('ix_crate_post_id', 'post_id'),
+    db.Index('ix_crate_user_saved_at_post', 'user_id', 'saved_at', 'post_id'),
+)
+
+# The follow rows whose followed account is pulled (User.fanout_pulled): each
+# follower's short list of accounts to merge into their following feed at read time
+pulled_follow = db.Table(
+    'pulled_follow',
+    db.Column('follower_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
 )
 
 class User(db.Model):
@@ -65,6 +185,12 @@ class User(db.Model):
     password_hash = db.Column(db.String(200), nullable=True)  # Optional now
     device_id = db.Column(db.String(200), nullable=True, index=True)  # Device identifier
     twitter = db.Column(db.String(100), nullable=True)  # X/Twitter handle
+    # Denormalized counters, maintained in api_follow (rebuild with `flask reconcile-counts`)
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default=text('0'))
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default=text('0'))
+    # Set once follower_count goes above FANOUT_FOLLOWER_LIMIT and never cleared, so an
+    # account dropping back below it doesn't lose posts that were never fanned out
+    fanout_pulled = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     posts = db.relationship('Post', backref='author', lazy='dynamic')
 
@@ -84,16 +210,81 @@ class User(db.Model):
         lazy='dynamic'
     )
 
+    # follow/unfollow touch only the one follow row, and move the counters
+    # only when that row actually changed, so repeats and races can't skew them
     def follow(self, user):
-        if not self.is_following(user):
-            self.following.append(user)
+        """Returns True if this created the follow, False if it already existed."""
+        created = db.session.execute(
+            insert_ignore(follow).values(follower_id=self.id, followed_id=user.id)
+        ).rowcount == 1
+        if created:
+            self.following_count = User.following_count + 1
+            user.follower_count = User.follower_count + 1
+        return created
 
     def unfollow(self, user):
-        if self.is_following(user):
-            self.following.remove(user)
+        """Returns True if this removed the follow, False if there was none."""
+        removed = db.session.execute(
+            db.delete(follow).where(follow.c.follower_id == self.id, follow.c.followed_id == user.id)
+        ).rowcount == 1
+        if removed:
+            self.following_count = User.following_count - 1
+            user.follower_count = User.follower_count - 1
+        return removed
 
     def is_following(self, user):
-        return self.following.filter(follow.c.followed_id == user.id).count() > 0
+        return follows(self.id, user.id)
+
+def follows(follower_id, followed_id):
+    """Single-row EXISTS on the follow primary key."""
+    return db.session.query(
+        db.select(follow).where(follow.c.follower_id == follower_id, follow.c.followed_id == followed_id).exists()
+    ).scalar()
+
+# Every username lookup filters on lower(username), which the plain unique index can't serve
+db.Index('ix_user_username_lower', func.lower(User.username))
+
+class Track(db.Model):
+    """One row per song, shared by every post of it, so metadata is fetched once."""
+    __tablename__ = 'track'
+    id = db.Column(db.Integer, primary_key=True)
+    platform = db.Column(db.String(20), nullable=False)
+    native_id = db.Column(db.String(100), nullable=False)  # Spotify track id / YouTube video id / Apple song id
+    title = db.Column(db.String(200))
+    artist = db.Column(db.String(200))
+    thumbnail = db.Column(db.String(300))
+    embed_url = db.Column(db.String(300))
+    # 'pending' until the enrich_track job fills in metadata, then 'ready' (or 'failed')
+    status = db.Column(db.String(20), nullable=False, default='ready', server_default=text("'ready'"))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('platform', 'native_id', name='uq_track_platform_native_id'),
+    )
+
+def _track_field(name, placeholder=None):
+    """
+    Post attribute served from the shared Track, falling back to the legacy
+    per-post column. `placeholder(post)` stands in while the value is missing
+    (track still pending, or failed to resolve).
+    """
+    def getter(self):
+        if self.track is not None:
+            value = getattr(self.track, name)
+        else:
+            value = getattr(self, f'_{name}')
+        if value is None and placeholder is not None:
+            return placeholder(self)
+        return value
+
+    def setter(self, value):
+        if self.track is not None:
+            setattr(self.track, name, value)
+        else:
+            setattr(self, f'_{name}', value)
+
+    return property(getter, setter)
 
 class Post(db.Model):
     __tablename__ = 'post'
@@ -101,11 +292,96 @@ class Post(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     platform = db.Column(db.String(20))
     url = db.Column(db.String(300))
-    title = db.Column(db.String(200))
-    artist = db.Column(db.String(200))
-    thumbnail = db.Column(db.String(300))
-    embed_url = db.Column(db.String(300))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    track_id = db.Column(db.Integer, db.ForeignKey('track.id'), index=True)
+    track = db.relationship('Track', lazy='joined')
+    # Legacy per-post metadata; posts that reference a Track leave these NULL
+    _title = db.Column('title', db.String(200))
+    _artist = db.Column('artist', db.String(200))
+    _thumbnail = db.Column('thumbnail', db.String(300))
+    _embed_url = db.Column('embed_url', db.String(300))
+    # Never null, so clients can always render a post; 'Unknown Artist' is hidden by the apps
+    title = _track_field('title', lambda post: 'Loading…' if post.status == 'pending' else 'Unknown Title')
+    artist = _track_field('artist', lambda post: 'Unknown Artist')
+    thumbnail = _track_field('thumbnail')
+    embed_url = _track_field('embed_url')
+
+    @property
+    def status(self):
+        return self.track.status if self.track is not None else 'ready'
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # Denormalized number of crate rows, maintained in api_crate
+    save_count = db.Column(db.Integer, nullable=False, default=0, server_default=text('0'))
+    # Canonical track identity ("spotify:<id>", "youtube:<id>", "apple:<id>"), see track_key_for_url
+    track_key = db.Column(db.String(320), index=True)
+    # True for the earliest post of its track_key; set in api_post, handed on in api_delete_post
+    is_first_discover = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    __table_args__ = (
+        # Serves newest-first feeds and (timestamp, id) keyset pagination
+        db.Index('ix_post_timestamp_id', 'timestamp', 'id'),
+        # Profile pages and pulled (non-fanned-out) authors: one user's posts newest-first
+        db.Index('ix_post_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
+
+class TimelineEntry(db.Model):
+    """
+    Per-user inbox for the following feed, filled on write (fan-out) so reading
+    it is an indexed range scan. Authors that went above FANOUT_FOLLOWER_LIMIT
+    (User.fanout_pulled) are not fanned out; their posts are pulled at read
+    time instead, for the followers listed in pulled_follow.
+    """
+    __tablename__ = 'timeline_entry'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True, index=True)
+    post_timestamp = db.Column(db.DateTime, nullable=False)  # copy of post.timestamp, for the index
+
+    __table_args__ = (
+        db.Index('ix_timeline_user_timestamp_post', 'user_id', 'post_timestamp', 'post_id'),
+    )
+
+class Job(db.Model):
+    """DB-backed work queue, drained by run_job_worker (thread or `flask run-worker`)."""
+    __tablename__ = 'job'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued / running / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+class Checkpoint(db.Model):
+    """
+    Named markers: progress of resumable batch jobs (e.g. the last track id
+    re-enriched) and the response-cache versions bumped by writers.
+    """
+    __tablename__ = 'checkpoint'
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.String(200))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheEntry(db.Model):
+    """Key/value rows backing the shared (cross-worker) layer of MetadataCache."""
+    __tablename__ = 'cache_entry'
+    key = db.Column(db.String(400), primary_key=True)
+    value = db.Column(db.Text)  # JSON; the literal 'null' marks a cached negative result
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class FeedEvent(db.Model):
+    """Live feed events, written by web workers and polled by every worker's SSE bridge (EVENT_BRIDGE=database)."""
+    __tablename__ = 'feed_event'
+    # Ids are SSE event ids and the bridge's high-water mark, so they must never be reused
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # 'post' / 'save_count'
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
 # ---------- HELPERS ----------
 def generate_username():
@@ -132,6 +408,123 @@ def generate_username():
     
     return username
 
+# ---------- FEED PAGINATION ----------
+FEED_PAGE_SIZE = 100
+PROFILE_PAGE_SIZE = 30  # first page of posts / crate embedded in the profile response
+
+def page_limit(default=FEED_PAGE_SIZE):
+    """The request's ?limit=, clamped to 1..FEED_PAGE_SIZE."""
+    return min(max(request.args.get('limit', default, type=int), 1), FEED_PAGE_SIZE)
+
+def encode_position(ts, row_id):
+    """Opaque keyset cursor for a (timestamp, id) position."""
+    raw = f"{ts.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def encode_cursor(post):
+    """Opaque keyset cursor for a post: its (timestamp, id) position in the feed."""
+    return encode_position(post.timestamp, post.id)
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, post_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(ts), int(post_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+def _keyset_page(query, key, position, newer, limit):
+    """Up to limit + 1 rows of one source, walking away from `position` along (timestamp, id) `key`."""
+    ts_col, id_col = key
+    if newer:
+        query = query.filter(tuple_(ts_col, id_col) > tuple_(*position))
+        return query.order_by(ts_col.asc(), id_col.asc()).limit(limit + 1).all()
+    if position:
+        query = query.filter(tuple_(ts_col, id_col) < tuple_(*position))
+    return query.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+def paginate_posts(query, cursor=None, since=None, limit=FEED_PAGE_SIZE, key=None, extra_sources=()):
+    """
+    Keyset-paginate a Post query newest-first.
+
+    - cursor: return posts older than this position (next page when scrolling)
+    - since:  return only posts newer than this position (refresh)
+    - key: the (timestamp, id) columns to walk, when an index other than
+      post's own serves the query (e.g. the timeline table)
+    - extra_sources: more (query, key) pairs merged into the same page
+
+    Returns (posts, headers) where headers carry the cursors for the next call.
+    """
+    sources = [(query, key or (Post.timestamp, Post.id))] + list(extra_sources)
+    newer = bool(since)
+    position = decode_cursor(since or cursor) if (since or cursor) else None
+    merged = {}
+    for source_query, source_key in sources:
+        for post in _keyset_page(source_query, source_key, position, newer, limit):
+            merged[post.id] = post
+    # Walk forward from the client's newest post on refresh so repeated calls never leave gaps
+    posts = sorted(merged.values(), key=lambda p: (p.timestamp, p.id), reverse=not newer)
+
+    headers = {}
+    if newer:
+        if len(posts) > limit:
+            posts = posts[:limit]
+            headers['X-More-Newer'] = 'true'
+        posts.reverse()
+        headers['X-Latest-Cursor'] = encode_cursor(posts[0]) if posts else since
+        return posts, headers
+
+    if len(posts) > limit:
+        posts = posts[:limit]
+        headers['X-Next-Cursor'] = encode_cursor(posts[-1])
+    if posts:
+        headers['X-Latest-Cursor'] = encode_cursor(posts[0])
+    return posts, headers
+
+def paginate_crate(user_id, cursor=None, limit=FEED_PAGE_SIZE):
+    """
+    Keyset-paginate a user's crate, most recently saved first. The cursor is
+    a (saved_at, post_id) position. Returns (posts, headers) like paginate_posts.
+    """
+    query = (
+        db.session.query(Post, crate.c.saved_at)
+        .join(crate, crate.c.post_id == Post.id)
+        .filter(crate.c.user_id == user_id)
+    )
+    position = decode_cursor(cursor) if cursor else None
+    rows = _keyset_page(query, (crate.c.saved_at, crate.c.post_id), position, False, limit)
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers['X-Next-Cursor'] = encode_position(rows[-1].saved_at, rows[-1].Post.id)
+    return [post for post, saved_at in rows], headers
+
+BATCH_LIMIT = 500  # ids per list in the batch endpoints
+
+def batch_ids(data, *keys):
+    """
+    The integer id lists under `keys` of a batch request body, as sets.
+    Raises ValueError for a body that isn't a JSON object, non-integer ids,
+    oversized lists, or an id that appears under more than one key (its
+    desired state would be ambiguous).
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Body must be a JSON object with {' / '.join(repr(key) for key in keys)} lists")
+    lists = []
+    for key in keys:
+        values = data.get(key) or []
+        if not isinstance(values, list) or not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            raise ValueError(f"'{key}' must be a list of integer ids")
+        if len(values) > BATCH_LIMIT:
+            raise ValueError(f"'{key}' has more than {BATCH_LIMIT} ids")
+        lists.append(set(values))
+    for i, first in enumerate(lists):
+        for second in lists[i + 1:]:
+            if first & second:
+                raise ValueError(f"ids in more than one list: {sorted(first & second)}")
+    return lists
+
 def login_required(f):
     from functools import wraps
     @wraps(f)
@@ -141,15 +534,340 @@ def login_required(f):
         return f(*args, **kwargs)
     return wrapper
 
+# ---------- METRICS ----------
+# Opt-in (METRICS=1) per-route instrumentation: request count and duration,
+# SQL statements and time, provider call time and response size, scraped
+# from /metrics and summarised per response in a Server-Timing header.
+# Counters live in each worker process, so scrape every worker.
+METRICS_ENABLED = os.environ.get('METRICS', '0') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # when set, /metrics requires it as a bearer token
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 20))  # statements per request before we log a likely N+1
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _sample(name, labels, value):
+    rendered = ','.join(f'{key}="{_label_value(val)}"' for key, val in labels.items())
+    return f'{name}{{{rendered}}} {value}' if rendered else f'{name} {value}'
+
+class MetricsRegistry:
+    """Thread-safe per-process counters and histograms, rendered in the Prometheus text format."""
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.requests = Counter()  # (route, method, status) -> requests
+        self.routes = {}  # route -> totals and duration histogram
+        self.external = {}  # provider -> {'calls', 'errors', 'seconds'}
+
+    def observe_request(self, route, method, status, duration, queries, db_seconds, external_seconds, size, over_budget):
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            totals = self.routes.get(route)
+            if totals is None:
+                totals = self.routes[route] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'seconds': 0.0, 'queries': 0,
+                    'db_seconds': 0.0, 'external_seconds': 0.0, 'response_bytes': 0, 'over_budget': 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    totals['buckets'][i] += 1
+            totals['count'] += 1
+            totals['seconds'] += duration
+            totals['queries'] += queries
+            totals['db_seconds'] += db_seconds
+            totals['external_seconds'] += external_seconds
+            totals['response_bytes'] += size
+            totals['over_budget'] += over_budget
+
+    def observe_external(self, provider, seconds, failed):
+        with self._lock:
+            totals = self.external.setdefault(provider, {'calls': 0, 'errors': 0, 'seconds': 0.0})
+            totals['calls'] += 1
+            totals['errors'] += failed
+            totals['seconds'] += seconds
+
+    def render(self, gauges=()):
+        """Prometheus exposition text; `gauges` adds (name, type, help, [(labels, value)]) families."""
+        with self._lock:
+            families = [
+                ('earshot_requests_total', 'counter', 'HTTP requests by route, method and status.',
+                 [({'route': r, 'method': m, 'status': s}, n) for (r, m, s), n in sorted(self.requests.items())]),
+                ('earshot_request_queries_total', 'counter', 'SQL statements run while handling requests.',
+                 [({'route': r}, t['queries']) for r, t in sorted(self.routes.items())]),
+                ('earshot_request_db_seconds_total', 'counter', 'Time spent in SQL statements while handling requests.',
+                 [({'route': r}, round(t['db_seconds'], 6)) for r, t in sorted(self.routes.items())]),
+                ('earshot_request_external_seconds_total', 'counter', 'Time spent calling metadata providers while handling requests.',
+                 [({'route': r}, round(t['external_seconds'], 6)) for r, t in sorted(self.routes.items())]),
+                ('earshot_response_bytes_total', 'counter', 'Response body bytes as sent (after compression).',
+                 [({'route': r}, t['response_bytes']) for r, t in sorted(self.routes.items())]),
+                ('earshot_query_budget_exceeded_total', 'counter', f'Requests that ran more than QUERY_BUDGET ({QUERY_BUDGET}) statements.',
+                 [({'route': r}, t['over_budget']) for r, t in sorted(self.routes.items())]),
+                ('earshot_external_calls_total', 'counter', 'Metadata provider calls, including background jobs.',
+                 [({'provider': p}, t['calls']) for p, t in sorted(self.external.items())]),
+                ('earshot_external_errors_total', 'counter', 'Metadata provider calls that failed.',
+                 [({'provider': p}, t['errors']) for p, t in sorted(self.external.items())]),
+                ('earshot_external_seconds_total', 'counter', 'Time spent in metadata provider calls, including background jobs.',
+                 [({'provider': p}, round(t['seconds'], 6)) for p, t in sorted(self.external.items())]),
+            ]
+            histogram = []
+            for route, totals in sorted(self.routes.items()):
+                for bound, count in zip(self.buckets, totals['buckets']):
+                    histogram.append(_sample('earshot_request_duration_seconds_bucket', {'route': route, 'le': bound}, count))
+                histogram.append(_sample('earshot_request_duration_seconds_bucket', {'route': route, 'le': '+Inf'}, totals['count']))
+                histogram.append(_sample('earshot_request_duration_seconds_sum', {'route': route}, round(totals['seconds'], 6)))
+                histogram.append(_sample('earshot_request_duration_seconds_count', {'route': route}, totals['count']))
+
+        lines = [
+            '# HELP earshot_request_duration_seconds Request handling time by route.',
+            '# TYPE earshot_request_duration_seconds histogram',
+            *histogram,
+        ]
+        for name, kind, help_text, samples in [*families, *gauges]:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(_sample(name, labels, value) for labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+metrics_registry = MetricsRegistry()
+
+def request_metrics():
+    """The current request's metrics dict, or None outside requests or with metrics off."""
+    return g.get('request_metrics') if has_request_context() else None
+
+@contextmanager
+def external_call(provider):
+    """Time a provider call into the metrics; a no-op when metrics are off."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics_registry.observe_external(provider, elapsed, failed)
+        stats = request_metrics()
+        if stats is not None:
+            stats['external_seconds'] += elapsed
+
+if METRICS_ENABLED:
+    @sa_event.listens_for(Engine, 'before_cursor_execute')
+    def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_start = time.perf_counter()
+
+    @sa_event.listens_for(Engine, 'after_cursor_execute')
+    def _record_statement(conn, cursor, statement, parameters, context, executemany):
+        stats = request_metrics()
+        if stats is None or context is None or not hasattr(context, '_metrics_start'):
+            return
+        stats['queries'] += 1
+        stats['db_seconds'] += time.perf_counter() - context._metrics_start
+        stats['statements'][statement] += 1
+
+@app.before_request
+def start_request_metrics():
+    if METRICS_ENABLED:
+        g.request_metrics = {
+            'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0,
+            'external_seconds': 0.0, 'statements': Counter(),
+        }
+
+# Registered before compress_response, so it runs after it and sees the bytes actually sent
+@app.after_request
+def record_request_metrics(response):
+    stats = g.pop('request_metrics', None)
+    if stats is None:
+        return response
+    duration = time.perf_counter() - stats['start']
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    size = 0 if response.is_streamed or response.direct_passthrough else len(response.get_data())
+    over_budget = stats['queries'] > QUERY_BUDGET
+    if over_budget:
+        statement, repeats = stats['statements'].most_common(1)[0]
+        app.logger.warning(
+            "Query budget exceeded: %s %s ran %d statements (budget %d); most repeated (%dx): %s",
+            request.method, route, stats['queries'], QUERY_BUDGET, repeats, ' '.join(statement.split())[:200],
+        )
+    metrics_registry.observe_request(
+        route, request.method, response.status_code, duration, stats['queries'],
+        stats['db_seconds'], stats['external_seconds'], size, over_budget,
+    )
+    response.headers['Server-Timing'] = (
+        f"db;dur={stats['db_seconds'] * 1000:.1f};desc=\"{stats['queries']} queries\", "
+        f"ext;dur={stats['external_seconds'] * 1000:.1f}, "
+        f"total;dur={duration * 1000:.1f}"
+    )
+    return response
+
+# ---------- HTTP CLIENT ----------
+# (connect, read) timeouts per provider, in seconds
+PROVIDER_TIMEOUTS = {
+    'spotify': (3.05, float(os.environ.get('SPOTIFY_TIMEOUT', 5))),
+    'youtube': (3.05, float(os.environ.get('YOUTUBE_TIMEOUT', 5))),
+    'itunes': (3.05, float(os.environ.get('ITUNES_TIMEOUT', 5))),
+}
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', 30))
+
+class ProviderUnavailable(Exception):
+    """Transient upstream failure (timeout, connection error, 5xx/429, open circuit). Worth retrying later."""
+
+class CircuitBreaker:
+    """
+    Per-provider breaker: after `threshold` consecutive transient failures the
+    provider is skipped for `reset_after` seconds, then a single trial call is
+    let through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, name, threshold=BREAKER_FAILURE_THRESHOLD, reset_after=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    print(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+PROVIDER_BREAKERS = {provider: CircuitBreaker(provider) for provider in PROVIDER_TIMEOUTS}
+
+def _make_http_session():
+    """Module-wide keep-alive session, so repeat lookups reuse pooled TLS connections."""
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        # 429 is not retried here: honouring Retry-After would sleep the calling thread for
+        # as long as the provider asks. It surfaces as ProviderUnavailable and the job backs off.
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=len(PROVIDER_TIMEOUTS), pool_maxsize=20, max_retries=retry)
+    http = requests.Session()
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    http.headers['User-Agent'] = 'earshot-metadata/1.0'
+    return http
+
+http_session = _make_http_session()
+
+def provider_get_json(provider, url, params=None):
+    """
+    GET a provider endpoint through the pooled session with that provider's
+    timeout, retries and circuit breaker. Raises ProviderUnavailable for
+    transient failures; other HTTP errors (e.g. 404 for an unknown id) raise
+    requests.HTTPError and don't count against the breaker.
+    """
+    breaker = PROVIDER_BREAKERS[provider]
+    if not breaker.allow():
+        raise ProviderUnavailable(f"{provider} circuit open")
+    try:
+        with external_call(provider):
+            response = http_session.get(url, params=params, timeout=PROVIDER_TIMEOUTS[provider])
+    except requests.RequestException as e:
+        breaker.record_failure()
+        raise ProviderUnavailable(f"{provider} request failed: {e}") from e
+    if response.status_code == 429 or response.status_code >= 500:
+        breaker.record_failure()
+        raise ProviderUnavailable(f"{provider} returned HTTP {response.status_code}")
+    breaker.record_success()
+    response.raise_for_status()
+    return response.json()
+
 # ---------- PARSERS ----------
-def parse_track_url(url: str):
+# Provider endpoints; overridable so benchmarks can point them at a local fixture server
+SPOTIFY_OEMBED_URL = os.environ.get('SPOTIFY_OEMBED_URL', 'https://open.spotify.com/oembed')
+YOUTUBE_OEMBED_URL = os.environ.get('YOUTUBE_OEMBED_URL', 'https://www.youtube.com/oembed')
+ITUNES_LOOKUP_URL = os.environ.get('ITUNES_LOOKUP_URL', 'https://itunes.apple.com/lookup')
+
+# Metadata-only yt-dlp configuration: no format resolution, no player JS, no manifests
+YTDLP_METADATA_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'noplaylist': True,
+    'check_formats': False,
+    'socket_timeout': 10,
+    'extractor_args': {'youtube': {'player_skip': ['js'], 'skip': ['dash', 'hls', 'translated_subs']}},
+}
+
+def youtube_music_info(url: str):
+    """Raw yt-dlp info dict (title, artist, track, channel, ...) without processing formats."""
+    with external_call('youtube'), yt_dlp.YoutubeDL(YTDLP_METADATA_OPTS) as ydl:
+        return ydl.extract_info(url, download=False, process=False)
+
+def extract_track_id(url: str):
+    """Return (platform, native_id) for a track URL without touching the network."""
     url = url.strip()
     if 'spotify.com' in url:
         m = re.search(r'spotify\.com/track/([a-zA-Z0-9]+)', url)
-        if not m: return None, None
-        track_id = m.group(1)
+        return ('spotify', m.group(1)) if m else (None, None)
+    if any(x in url for x in ['youtube.com', 'youtu.be', 'music.youtube.com']):
+        m = re.search(r'(?:v=|youtu\.be/|youtube\.com/embed/)([a-zA-Z0-9_-]+)', url)
+        return ('youtube', m.group(1)) if m else (None, None)
+    if 'music.apple.com' in url:
+        m = re.search(r'music\.apple\.com/[^/]+/song/(\d+)', url)
+        return ('apple', m.group(1)) if m else (None, None)
+    return None, None
+
+def track_key_for_url(url: str):
+    """
+    Canonical key shared by every post of the same track, so different share
+    links (?si=..., youtu.be vs youtube.com) count as one song. URLs we can't
+    extract an id from fall back to the raw URL.
+    """
+    platform, native_id = extract_track_id(url)
+    if not native_id:
+        return f"url:{url.strip()}"[:320]
+    return f"{platform}:{native_id}"
+
+def parse_track_url(url: str):
+    url = url.strip()
+    if 'spotify.com' in url:
+        platform, track_id = extract_track_id(url)
+        if not track_id: return None, None
         try:
-            o = requests.get(f"https://open.spotify.com/oembed?url={url}").json()
+            o = provider_get_json('spotify', SPOTIFY_OEMBED_URL, params={'url': url})
             full = o['title']
             # Spotify oembed format: "Song Name · Artist Name"
             # Try multiple separators
@@ -172,90 +890,74 @@ def parse_track_url(url: str):
                 'thumbnail': o['thumbnail_url'],
                 'embed_url': f"https://open.spotify.com/embed/track/{track_id}"
             }
+        except ProviderUnavailable:
+            raise
         except Exception as e:
             print(f"Spotify parsing error: {e}")
             return None, None
 
     if any(x in url for x in ['youtube.com', 'youtu.be', 'music.youtube.com']):
-        m = re.search(r'(?:v=|youtu\.be/|youtube\.com/embed/)([a-zA-Z0-9_-]+)', url)
-        if not m: return None, None
-        video_id = m.group(1)
+        platform, video_id = extract_track_id(url)
+        if not video_id: return None, None
+        # Fast path: one oEmbed request gives title, channel and thumbnail
+        oembed_error = None
         try:
-            # Use yt-dlp to get better metadata (especially for YouTube Music)
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'Unknown Title')
-                thumbnail = info.get('thumbnail') or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
-                
-                # Prioritize channel/uploader as artist (they're typically the artist)
-                # Only use explicit 'artist' field if it exists, otherwise use channel/uploader
-                artist = info.get('artist')  # Use explicit artist field if available
-                if not artist:
-                    # Use channel or uploader as artist (they're usually the artist)
-                    artist = info.get('channel') or info.get('uploader') or 'Unknown Artist'
-                
-                # Only try parsing from title if we don't have a good artist name
-                if artist == 'Unknown Artist':
-                    for sep in [' - ', ' · ', ' | ', ' — ', ' – ', ' by ']:
-                        if sep in title:
-                            parts = [x.strip() for x in title.rsplit(sep, 1)]
-                            if len(parts) == 2:
-                                # Common formats: "Artist - Song" or "Song - Artist"
-                                # Usually the first part is artist, but check length
-                                if len(parts[0]) < 50:  # Artist names are usually shorter
-                                    artist, title = parts[0], parts[1]
-                                else:
-                                    title, artist = parts[0], parts[1]
-                                break
-                
-                return 'youtube', {
-                    'title': title,
-                    'artist': artist,
-                    'thumbnail': thumbnail,
-                    'embed_url': f"https://www.youtube.com/embed/{video_id}"
-                }
+            o = provider_get_json(
+                'youtube',
+                YOUTUBE_OEMBED_URL,
+                params={'url': f"https://www.youtube.com/watch?v={video_id}", 'format': 'json'}
+            )
+            title = o['title']
+            artist = o.get('author_name') or 'Unknown Artist'
+            thumbnail = o.get('thumbnail_url') or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
         except Exception as e:
-            print(f"YouTube parsing error: {e}")
-            # Fallback to oembed if yt-dlp fails
-            # Note: oembed doesn't provide channel info, so we parse from title
+            print(f"YouTube oEmbed error: {e}")
+            oembed_error = e
+            title = artist = thumbnail = None
+
+        # YouTube Music links and auto-generated "Artist - Topic" uploads carry the real
+        # artist only in the player metadata, so only they pay for a yt-dlp lookup
+        if title is None or 'music.youtube.com' in url or artist.endswith(' - Topic'):
             try:
-                o = requests.get(f"https://www.youtube.com/oembed?url={url}&format=json").json()
-                full = o['title']
-                # Try to get author/channel name from oembed (if available)
-                artist = o.get('author_name') or 'Unknown Artist'
-                
-                # If we got author from oembed, use it; otherwise try parsing from title
-                if artist == 'Unknown Artist':
-                    for sep in [' - ', ' · ', ' | ', ' — ', ' – ']:
-                        if sep in full:
-                            parts = [x.strip() for x in full.rsplit(sep, 1)]
-                            if len(parts) == 2:
-                                if len(parts[0]) < 50:
-                                    artist, full = parts[0], parts[1]
-                                else:
-                                    full, artist = parts[0], parts[1]
-                                break
-                
-                return 'youtube', {
-                    'title': full,
-                    'artist': artist,
-                    'thumbnail': o['thumbnail_url'],
-                    'embed_url': f"https://www.youtube.com/embed/{video_id}"
-                }
-            except:
-                return None, None
+                info = youtube_music_info(url)
+                title = title or info.get('title') or 'Unknown Title'
+                artist = info.get('artist') or info.get('channel') or info.get('uploader') or artist or 'Unknown Artist'
+                thumbnail = thumbnail or info.get('thumbnail') or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+            except Exception as e:
+                print(f"YouTube parsing error: {e}")
+                if title is None:
+                    if isinstance(oembed_error, ProviderUnavailable):
+                        raise oembed_error
+                    return None, None
+        if artist.endswith(' - Topic'):
+            artist = artist[:-len(' - Topic')]
+
+        # Only try parsing from title if we don't have a good artist name
+        if artist == 'Unknown Artist':
+            for sep in [' - ', ' · ', ' | ', ' — ', ' – ', ' by ']:
+                if sep in title:
+                    parts = [x.strip() for x in title.rsplit(sep, 1)]
+                    if len(parts) == 2:
+                        # Common formats: "Artist - Song" or "Song - Artist"
+                        # Usually the first part is artist, but check length
+                        if len(parts[0]) < 50:  # Artist names are usually shorter
+                            artist, title = parts[0], parts[1]
+                        else:
+                            title, artist = parts[0], parts[1]
+                        break
+
+        return 'youtube', {
+            'title': title,
+            'artist': artist,
+            'thumbnail': thumbnail,
+            'embed_url': f"https://www.youtube.com/embed/{video_id}"
+        }
 
     if 'music.apple.com' in url:
-        m = re.search(r'music\.apple\.com/[^/]+/song/(\d+)', url)
-        if not m: return None, None
-        song_id = m.group(1)
+        platform, song_id = extract_track_id(url)
+        if not song_id: return None, None
         try:
-            data = requests.get(f"https://itunes.apple.com/lookup?id={song_id}&entity=song").json()
+            data = provider_get_json('itunes', ITUNES_LOOKUP_URL, params={'id': song_id, 'entity': 'song'})
             if data['resultCount'] == 0: return None, None
             track = data['results'][0]
             thumb = track['artworkUrl100'].replace('100x100', '300x300')
@@ -265,14 +967,1085 @@ def parse_track_url(url: str):
                 'thumbnail': thumb,
                 'embed_url': url.replace('/song/', '/embed/song/')
             }
+        except ProviderUnavailable:
+            raise
         except: return None, None
 
     return None, None
 
+# ---------- METADATA CACHE ----------
+METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', 7 * 24 * 3600))  # seconds
+METADATA_NEGATIVE_TTL = int(os.environ.get('METADATA_NEGATIVE_TTL', 600))  # bad/unresolvable URLs
+_MISSING = object()
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+class DatabaseCacheStore:
+    """Shared store in the cache_entry table. Uses its own connection so it never commits the request's session."""
+
+    def get(self, key):
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                db.select(CacheEntry.value, CacheEntry.expires_at).where(CacheEntry.key == key)
+            ).first()
+        if row is None or row.expires_at < datetime.utcnow():
+            return _MISSING
+        return json.loads(row.value)
+
+    def set(self, key, value, ttl):
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        with db.engine.begin() as conn:
+            conn.execute(db.delete(CacheEntry).where(CacheEntry.key == key))
+            conn.execute(db.insert(CacheEntry).values(key=key, value=json.dumps(value), expires_at=expires_at))
+
+    def delete(self, key):
+        with db.engine.begin() as conn:
+            conn.execute(db.delete(CacheEntry).where(CacheEntry.key == key))
+
+    def purge_expired(self):
+        with db.engine.begin() as conn:
+            return conn.execute(db.delete(CacheEntry).where(CacheEntry.expires_at < datetime.utcnow())).rowcount
+
+class FileCacheStore:
+    """Shared store as one JSON file per key, for deployments without a writable database."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+        if entry['expires_at'] < time.time():
+            return _MISSING
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        tmp = self._path(key) + f'.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'value': value, 'expires_at': time.time() + ttl}, f)
+        os.replace(tmp, self._path(key))  # atomic, so readers never see a partial file
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    if json.load(f)['expires_at'] < time.time():
+                        os.remove(path)
+                        removed += 1
+            except (OSError, ValueError, KeyError):
+                continue
+        return removed
+
+class MetadataCache:
+    """
+    Tiered cache: in-process LRU in front of an optional shared store.
+    A cached value of None is a negative result (URL that resolved to nothing).
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.stats = {'hits': 0, 'local_hits': 0, 'shared_hits': 0, 'negative_hits': 0, 'misses': 0, 'errors': 0}
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self.stats['local_hits'] += 1
+        elif self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"Metadata cache read error: {e}")
+                self.stats['errors'] += 1
+                value = _MISSING
+            if value is not _MISSING:
+                self.stats['shared_hits'] += 1
+                # Shared rows carry their own expiry; keep the local copy short-lived
+                self.local.set(key, value, min(METADATA_NEGATIVE_TTL, 60) if value is None else 300)
+        if value is _MISSING:
+            self.stats['misses'] += 1
+            return _MISSING
+        self.stats['hits'] += 1
+        if value is None:
+            self.stats['negative_hits'] += 1
+        return value
+
+    def set(self, key, value):
+        ttl = METADATA_NEGATIVE_TTL if value is None else METADATA_CACHE_TTL
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value, ttl)
+            except Exception as e:
+                print(f"Metadata cache write error: {e}")
+                self.stats['errors'] += 1
+
+def _make_metadata_cache():
+    store = os.environ.get('METADATA_CACHE_STORE', 'database')  # 'database', 'file' or 'none'
+    if store == 'file':
+        shared = FileCacheStore(os.environ.get('METADATA_CACHE_DIR', os.path.join(app.instance_path, 'metadata-cache')))
+    elif store == 'none':
+        shared = None
+    else:
+        shared = DatabaseCacheStore()
+    return MetadataCache(LRUCache(int(os.environ.get('METADATA_CACHE_SIZE', 2048))), shared)
+
+metadata_cache = _make_metadata_cache()
+
+def fetch_track_metadata(url: str, refresh=False):
+    """
+    Cached front for parse_track_url, keyed by normalized platform id so every
+    share link of a song maps to one entry. refresh=True skips the read but
+    still stores the new result. ProviderUnavailable propagates uncached so
+    callers (e.g. the enrich_track job) can retry later.
+    """
+    platform, native_id = extract_track_id(url)
+    if not native_id:
+        return None, None  # parse_track_url would reject it without any network call
+    key = f"meta:{platform}:{native_id}"
+    if not refresh:
+        cached = metadata_cache.get(key)
+        if cached is not _MISSING:
+            return (cached['platform'], cached['info']) if cached else (None, None)
+    platform, info = parse_track_url(url)
+    metadata_cache.set(key, {'platform': platform, 'info': info} if info else None)
+    return platform, info
+
+def placeholder_metadata(platform, native_id, url):
+    """Fields derivable from the URL alone, shown while a track is still pending."""
+    if platform == 'spotify':
+        return {'embed_url': f"https://open.spotify.com/embed/track/{native_id}"}
+    if platform == 'youtube':
+        return {
+            'thumbnail': f"https://i.ytimg.com/vi/{native_id}/hqdefault.jpg",
+            'embed_url': f"https://www.youtube.com/embed/{native_id}",
+        }
+    return {'embed_url': url.replace('/song/', '/embed/song/')}
+
+def get_or_create_track(url: str):
+    """
+    Return the Track for a share URL, creating it on first sight.
+    Nothing here touches the network: new tracks are inserted as 'pending' and
+    an enrich_track job fetches their metadata in the background. Reposts of a
+    known song are a single indexed query. Returns None for unsupported URLs.
+    """
+    platform, native_id = extract_track_id(url)
+    if not native_id:
+        return None
+    track = Track.query.filter_by(platform=platform, native_id=native_id).first()
+    if track:
+        if track.status == 'failed':
+            # Give previously unresolvable songs another chance when someone re-shares them
+            track.status = 'pending'
+            enqueue_job('enrich_track', {'track_id': track.id, 'url': url})
+        return track
+
+    track = Track(
+        platform=platform,
+        native_id=native_id,
+        status='pending',
+        **placeholder_metadata(platform, native_id, url),
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(track)
+    except IntegrityError:
+        # Another request created the same track concurrently; its job covers enrichment
+        return Track.query.filter_by(platform=platform, native_id=native_id).first()
+    enqueue_job('enrich_track', {'track_id': track.id, 'url': url})
+    return track
+
+# ---------- RESPONSE CACHE ----------
+# Cached JSON for responses that are the same for every viewer (a profile, the
+# global feed). Each is tied to a version scope stored in the checkpoint table;
+# writers bump the scope in their own transaction, so every worker stops
+# serving the old body as soon as the write commits.
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))  # seconds
+GLOBAL_FEED_SCOPE = 'feed:global'
+TIMELINE_SCOPE = 'timelines'  # bumped whenever fan-out/backfill changes anyone's following timeline
+
+def user_scope(user_id):
+    """Version scope for everything shown on a user's profile."""
+    return f'user:{user_id}'
+
+class ResponseCache:
+    """
+    In-process LRU in front of an optional shared store (same stores as
+    MetadataCache). Entries are keyed by (key, version), so a version bump
+    makes old entries unreachable instead of having to delete them.
+    """
+
+    def __init__(self, local, shared=None, ttl=RESPONSE_CACHE_TTL):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    def get(self, key, version):
+        versioned = f'{key}@{version}'
+        value = self.local.get(versioned)
+        if value is _MISSING and self.shared is not None:
+            try:
+                value = self.shared.get(versioned)
+            except Exception as e:
+                print(f"Response cache read error: {e}")
+                self.stats['errors'] += 1
+                value = _MISSING
+            if value is not _MISSING:
+                self.local.set(versioned, value, self.ttl)
+        self.stats['misses' if value is _MISSING else 'hits'] += 1
+        return value
+
+    def set(self, key, version, value):
+        versioned = f'{key}@{version}'
+        self.local.set(versioned, value, self.ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(versioned, value, self.ttl)
+            except Exception as e:
+                print(f"Response cache write error: {e}")
+                self.stats['errors'] += 1
+
+def _make_response_cache():
+    store = os.environ.get('RESPONSE_CACHE_STORE', 'none')  # 'none', 'database' or 'file'
+    if store == 'database':
+        shared = DatabaseCacheStore()
+    elif store == 'file':
+        shared = FileCacheStore(os.environ.get('RESPONSE_CACHE_DIR', os.path.join(app.instance_path, 'response-cache')))
+    else:
+        shared = None
+    return ResponseCache(LRUCache(int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))), shared)
+
+response_cache = _make_response_cache()
+
+def cache_versions(*scopes):
+    """Current version of each scope in one query; never-bumped scopes are '0'."""
+    names = [f'cache:{scope}' for scope in scopes]
+    rows = dict(db.session.execute(
+        db.select(Checkpoint.name, Checkpoint.value).where(Checkpoint.name.in_(names))
+    ).all())
+    return {scope: rows.get(name, '0') for scope, name in zip(scopes, names)}
+
+CACHE_BUMP_CHUNK = 500  # scopes per upsert, well under SQLite's bound-parameter limit
+
+def bump_cache_versions(*scopes):
+    """Give each scope a fresh version. Runs in the caller's transaction, so it takes effect on commit."""
+    version = os.urandom(6).hex()
+    now = datetime.utcnow()
+    # One upsert per chunk of scopes; sorted so concurrent writers lock rows in the same order
+    scopes = sorted(set(scopes))
+    for start in range(0, len(scopes), CACHE_BUMP_CHUNK):
+        stmt = dialect_insert(Checkpoint.__table__).values([
+            {'name': f'cache:{scope}', 'value': version, 'updated_at': now}
+            for scope in scopes[start:start + CACHE_BUMP_CHUNK]
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'value': stmt.excluded.value, 'updated_at': stmt.excluded.updated_at},
+        ))
+
+def response_etag(*parts):
+    """Strong ETag from version markers and whatever else selects the response (viewer, query params)."""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+def not_modified(etag):
+    """304 for a matching If-None-Match, or None when the client's copy is stale."""
+    # Compressed representations carry a suffixed ETag (see compress_response)
+    for tag in (etag, *(f'{etag}-{encoding}' for encoding in COMPRESSION_ENCODINGS)):
+        if request.if_none_match.contains(tag):
+            return with_etag(Response(status=304), tag)
+    return None
+
+def with_etag(response, etag):
+    # private: responses depend on the Authorization header; no-cache: always revalidate
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def bump_post_cache_versions(post_ids, *scopes):
+    """
+    Posts now render differently (save_count, track metadata, first-discover
+    badge): bump the global feed, `scopes`, and their authors' profiles.
+    Savers' crates need no bump, since crate items are rendered live (see
+    crate_items); a popular post's savers never land on the write path.
+    """
+    post_ids = sorted(set(post_ids))
+    author_ids = set()
+    for start in range(0, len(post_ids), CACHE_BUMP_CHUNK):
+        author_ids.update(db.session.scalars(
+            db.select(Post.user_id).where(Post.id.in_(post_ids[start:start + CACHE_BUMP_CHUNK]))
+        ).all())
+    bump_cache_versions(GLOBAL_FEED_SCOPE, *scopes, *[user_scope(user_id) for user_id in author_ids])
+
+def bump_track_cache_versions(*track_ids):
+    """Tracks' metadata changed: every post of them is stale wherever it is shown."""
+    bump_post_cache_versions(db.session.scalars(db.select(Post.id).where(Post.track_id.in_(track_ids))).all())
+
+# ---------- CURRENT USER ----------
+IDENTITY_CACHE_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', 0))  # seconds; 0 = load from the DB every request
+identity_cache = LRUCache(int(os.environ.get('IDENTITY_CACHE_SIZE', 4096)))
+
+def request_user_id():
+    """
+    The JWT subject as an int, or None for anonymous requests. Reuses the
+    token @jwt_required already verified; elsewhere the token is verified
+    once per request and an invalid or expired one reads as anonymous.
+    """
+    if 'current_user_id' not in g:
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:  # no @jwt_required on this route
+            try:
+                verify_jwt_in_request(optional=True)
+                identity = get_jwt_identity()
+            except Exception:
+                identity = None
+        g.current_user_id = int(identity) if identity else None
+    return g.current_user_id
+
+def request_user():
+    """The requesting User (None if anonymous or deleted), loaded once per request into g.current_user."""
+    if 'current_user' not in g:
+        user_id = request_user_id()
+        g.current_user = load_user(user_id) if user_id is not None else None
+    return g.current_user
+
+def load_user(user_id):
+    """
+    db.session.get(User, user_id), optionally served from a per-worker TTL
+    cache: the cached row is merged into the session without a query. Its
+    counters may then be up to IDENTITY_CACHE_TTL seconds old, which is fine
+    for authorization and for counter updates written as SQL expressions.
+    """
+    if IDENTITY_CACHE_TTL > 0:
+        cached = identity_cache.get(user_id)
+        if cached is not _MISSING:
+            return db.session.merge(cached, load=False)
+    user = db.session.get(User, user_id)
+    if user is not None and IDENTITY_CACHE_TTL > 0:
+        snapshot = User(**{attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs})
+        make_transient_to_detached(snapshot)
+        identity_cache.set(user_id, snapshot, IDENTITY_CACHE_TTL)
+    return user
+
+def forget_user(user_id):
+    """Drop a user from this worker's identity cache after changing their row."""
+    identity_cache.delete(user_id)
+
+# ---------- BACKGROUND JOBS ----------
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_STALE_AFTER = timedelta(minutes=10)  # running jobs older than this are assumed dead and requeued
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', 8))  # jobs mostly wait on provider I/O, so overlap them
+JOB_HANDLERS = {}  # kind -> (handler, on_give_up)
+_job_wakeup = threading.Event()
+_job_thread = None
+_job_thread_lock = threading.Lock()
+
+def job_handler(kind, on_give_up=None):
+    """
+    Register a function as the handler for jobs of this kind. It receives the
+    decoded payload; on_give_up(payload) runs once retries are exhausted.
+    """
+    def decorator(f):
+        JOB_HANDLERS[kind] = (f, on_give_up)
+        return f
+    return decorator
+
+def enqueue_job(kind, payload, delay=0):
+    """Add a job to the current session; it becomes visible to workers when the caller commits."""
+    job = Job(kind=kind, payload=json.dumps(payload), run_after=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    start_job_thread()
+    return job
+
+def wake_job_worker():
+    """Nudge the in-process worker thread after a commit so new jobs don't wait for the next poll."""
+    _job_wakeup.set()
+
+def claim_jobs(limit=10):
+    """Atomically move up to `limit` due jobs from queued to running. Safe across processes."""
+    now = datetime.utcnow()
+    db.session.execute(
+        db.update(Job)
+        .where(Job.status == 'running', Job.locked_at < now - JOB_STALE_AFTER)
+        .values(status='queued')
+    )
+    candidate_ids = db.session.scalars(
+        db.select(Job.id)
+        .where(Job.status == 'queued', Job.run_after <= now)
+        .order_by(Job.id)
+        .limit(limit)
+    ).all()
+    claimed = []
+    for job_id in candidate_ids:
+        result = db.session.execute(
+            db.update(Job)
+            .where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+        )
+        if result.rowcount == 1:
+            claimed.append(job_id)
+    db.session.commit()
+    return [db.session.get(Job, job_id) for job_id in claimed]
+
+def run_job(job):
+    """Run one claimed job. Successful jobs are deleted; failures retry with backoff up to JOB_MAX_ATTEMPTS."""
+    handler, on_give_up = JOB_HANDLERS.get(job.kind, (None, None))
+    try:
+        if handler is None:
+            raise RuntimeError(f"No handler for job kind {job.kind!r}")
+        handler(json.loads(job.payload))
+        db.session.delete(job)
+        db.session.commit()
+    except Exception as e:
+        print(f"Job #{job.id} ({job.kind}) failed: {e}")
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = str(e)[:2000]
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            job.status = 'failed'
+            if on_give_up is not None:
+                try:
+                    on_give_up(json.loads(job.payload))
+                except Exception as give_up_error:
+                    print(f"Job #{job.id} give-up hook failed: {give_up_error}")
+        else:
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=5 * 2 ** job.attempts)
+        db.session.commit()
+
+def _run_job_by_id(job_id):
+    """run_job on a pool thread, with its own app context and session."""
+    with app.app_context():
+        run_job(db.session.get(Job, job_id))
+
+def run_job_worker(poll_interval=1.0, once=False, stop_event=None, concurrency=None):
+    """
+    Drain the job table until stopped. Must be called inside an app context.
+    Claimed jobs run on up to `concurrency` threads (JOB_CONCURRENCY), so
+    one slow provider lookup doesn't hold up the rest of the batch.
+    """
+    concurrency = concurrency or JOB_CONCURRENCY
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='earshot-job') if concurrency > 1 else None
+    try:
+        while stop_event is None or not stop_event.is_set():
+            try:
+                jobs = claim_jobs(limit=max(10, 2 * concurrency))
+            except Exception as e:
+                print(f"Job worker could not claim jobs: {e}")
+                db.session.rollback()
+                jobs = []
+            if executor is None:
+                for job in jobs:
+                    run_job(job)
+            else:
+                list(executor.map(_run_job_by_id, [job.id for job in jobs]))
+            db.session.remove()
+            if once and not jobs:
+                return
+            if not jobs:
+                _job_wakeup.wait(poll_interval)
+                _job_wakeup.clear()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def start_job_thread():
+    """
+    Start the in-process worker thread (once per process) unless JOB_WORKER=external,
+    in which case jobs are drained by a separate `flask --app app run-worker` process.
+    """
+    global _job_thread
+    if os.environ.get('JOB_WORKER', 'thread') != 'thread':
+        return
+    if _job_thread is not None and _job_thread.is_alive():
+        return
+    with _job_thread_lock:
+        if _job_thread is not None and _job_thread.is_alive():
+            return
+
+        def target():
+            with app.app_context():
+                run_job_worker()
+
+        _job_thread = threading.Thread(target=target, name='earshot-job-worker', daemon=True)
+        _job_thread.start()
+
+def mark_track_failed(payload):
+    track = db.session.get(Track, payload['track_id'])
+    if track is not None and track.status == 'pending':
+        track.status = 'failed'
+        bump_track_cache_versions(track.id)
+
+@job_handler('enrich_track', on_give_up=mark_track_failed)
+def enrich_track(payload):
+    """
+    Fetch metadata for a pending track and mark it ready (or failed if the URL
+    doesn't resolve). Provider outages raise ProviderUnavailable, which makes
+    the job retry with backoff.
+    """
+    track = db.session.get(Track, payload['track_id'])
+    if track is None or track.status == 'ready':
+        return
+    platform, info = fetch_track_metadata(payload['url'])
+    if info:
+        track.title = info['title']
+        track.artist = info.get('artist')
+        track.thumbnail = info['thumbnail']
+        track.embed_url = info['embed_url']
+        track.status = 'ready'
+    else:
+        track.status = 'failed'
+    bump_track_cache_versions(track.id)
+    db.session.commit()
+
+# ---------- RE-ENRICHMENT ----------
+REENRICH_CHECKPOINT = 'reenrich_tracks'
+
+def _refetch_track(row):
+    """Thread-pool worker: fresh metadata for one (track_id, url) row. Never raises."""
+    track_id, url = row
+    try:
+        with app.app_context():
+            platform, info = fetch_track_metadata(url, refresh=True)
+        return track_id, info, None
+    except Exception as e:
+        return track_id, None, e
+
+def reenrich_tracks(chunk_size=200, workers=8, resume=True, max_chunks=None, log=print):
+    """
+    Re-fetch metadata for every track, streaming tracks in id order in chunks.
+    Each chunk is fetched with a bounded thread pool, written with one bulk
+    UPDATE and committed together with the checkpoint, so an interrupted run
+    resumes after the last committed chunk. Stops after max_chunks if given.
+    """
+    attached, _, _ = attach_posts_to_tracks()
+    if attached:
+        log(f"Attached {attached} legacy posts to tracks")
+
+    checkpoint = db.session.get(Checkpoint, REENRICH_CHECKPOINT)
+    if checkpoint is None:
+        checkpoint = Checkpoint(name=REENRICH_CHECKPOINT, value='0')
+        db.session.add(checkpoint)
+        db.session.commit()  # don't hold a write transaction while fetch threads write the cache
+    last_id = int(checkpoint.value) if resume else 0
+    summary = {'processed': 0, 'updated': 0, 'skipped': 0, 'failed': 0, 'done': False}
+    sample_url = (
+        db.select(Post.url).where(Post.track_id == Track.id)
+        .order_by(Post.id).limit(1).scalar_subquery()
+    )
+    started = time.perf_counter()
+    chunks = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while max_chunks is None or chunks < max_chunks:
+            tracks = {
+                t.id: t for t in
+                Track.query.filter(Track.id > last_id).order_by(Track.id).limit(chunk_size).all()
+            }
+            if not tracks:
+                summary['done'] = True
+                checkpoint.value = '0'  # the next run is a fresh pass, not a resume
+                db.session.commit()
+                break
+            urls = dict(db.session.execute(
+                db.select(Track.id, sample_url).where(Track.id.in_(list(tracks)))
+            ).all())
+
+            chunk_started = time.perf_counter()
+            updates = []
+            rows = [(track_id, urls[track_id]) for track_id in tracks if urls.get(track_id)]
+            summary['skipped'] += len(tracks) - len(rows)  # tracks whose posts were all deleted
+            for track_id, info, error in pool.map(_refetch_track, rows):
+                track = tracks[track_id]
+                if error is not None or not info:
+                    summary['failed'] += 1
+                    continue
+                changes = {}
+                new_artist = info.get('artist', 'Unknown Artist')
+                if new_artist != 'Unknown Artist' and new_artist != track.artist:
+                    changes['artist'] = new_artist
+                if info.get('title') and info['title'] != track.title:
+                    changes['title'] = info['title']
+                if info.get('thumbnail') and info['thumbnail'] != track.thumbnail:
+                    changes['thumbnail'] = info['thumbnail']
+                if track.status != 'ready':
+                    changes['status'] = 'ready'
+                    changes['embed_url'] = info['embed_url']
+                if changes:
+                    updates.append({'id': track_id, 'updated_at': datetime.utcnow(), **changes})
+                else:
+                    summary['skipped'] += 1
+
+            if updates:
+                # Bulk UPDATE by primary key; rows with different changed columns are grouped by SQLAlchemy
+                db.session.execute(db.update(Track), updates)
+                bump_track_cache_versions(*[update['id'] for update in updates])
+            last_id = max(tracks)
+            checkpoint.value = str(last_id)
+            db.session.commit()
+
+            chunks += 1
+            summary['processed'] += len(tracks)
+            summary['updated'] += len(updates)
+            chunk_rate = len(tracks) / max(time.perf_counter() - chunk_started, 1e-9)
+            log(f"Chunk up to track #{last_id}: {len(tracks)} tracks, {len(updates)} updated, {chunk_rate:.1f} tracks/s")
+
+    elapsed = time.perf_counter() - started
+    summary['last_id'] = last_id
+    summary['elapsed_s'] = round(elapsed, 2)
+    summary['tracks_per_s'] = round(summary['processed'] / elapsed, 2) if elapsed else 0.0
+    log(f"Re-enrichment {'finished' if summary['done'] else 'paused'}: {summary}")
+    return summary
+
+@job_handler('reenrich_tracks')
+def reenrich_tracks_job(payload):
+    """Run a bounded slice of the re-enrichment, then re-queue itself until every track is done."""
+    summary = reenrich_tracks(
+        chunk_size=payload.get('chunk_size', 200),
+        workers=payload.get('workers', 8),
+        max_chunks=payload.get('max_chunks', 10),  # keeps each run well under JOB_STALE_AFTER
+    )
+    if not summary['done']:
+        enqueue_job('reenrich_tracks', payload)
+        db.session.commit()
+
+@app.cli.command('reenrich-tracks')
+@click.option('--chunk-size', default=200, show_default=True, help='Tracks per batch/commit.')
+@click.option('--workers', default=8, show_default=True, help='Concurrent metadata fetches.')
+@click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and start from the first track.')
+def reenrich_tracks_command(chunk_size, workers, restart):
+    """Re-fetch metadata for all tracks (resumable, parallel)."""
+    reenrich_tracks(chunk_size=chunk_size, workers=workers, resume=not restart)
+
+# ---------- FOLLOWING TIMELINE ----------
+FANOUT_FOLLOWER_LIMIT = int(os.environ.get('FANOUT_FOLLOWER_LIMIT', 5000))  # above this, followers pull instead
+FOLLOW_BACKFILL_POSTS = int(os.environ.get('FOLLOW_BACKFILL_POSTS', 200))
+
+def dialect_insert(table):
+    """INSERT construct of the active dialect, for its ON CONFLICT clauses."""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def insert_ignore(table):
+    """INSERT that skips rows violating a unique/primary key (ON CONFLICT DO NOTHING)."""
+    return dialect_insert(table).on_conflict_do_nothing()
+
+def timeline_insert_from(select_stmt):
+    """INSERT INTO timeline_entry (user_id, post_id, post_timestamp) <select>, ignoring rows already present."""
+    # SQLite can't tell "ON CONFLICT" from a join's ON clause after a bare SELECT;
+    # selecting from a subquery with an explicit WHERE removes the ambiguity
+    source = db.select(select_stmt.subquery()).where(db.true())
+    return db.session.execute(
+        insert_ignore(TimelineEntry.__table__).from_select(['user_id', 'post_id', 'post_timestamp'], source)
+    ).rowcount
+
+def pulled_author_ids(user_id):
+    """Accounts `user_id` follows whose posts are read on demand rather than fanned out."""
+    return db.session.scalars(db.select(pulled_follow.c.followed_id).where(pulled_follow.c.follower_id == user_id)).all()
+
+def pull_popular_authors(user_ids=None):
+    """
+    Switch accounts (of `user_ids`, or all) that went above FANOUT_FOLLOWER_LIMIT
+    over to pulling, and put them on their followers' pulled lists. Their posts
+    already fanned out stay in timelines; the feed merges both sources.
+    Returns the ids switched.
+    """
+    query = db.update(User).where(~User.fanout_pulled, User.follower_count > FANOUT_FOLLOWER_LIMIT)
+    if user_ids is not None:
+        query = query.where(User.id.in_(user_ids))
+    pulled_ids = db.session.scalars(query.values(fanout_pulled=True).returning(User.id)).all()
+    if pulled_ids:
+        db.session.execute(insert_ignore(pulled_follow).from_select(
+            ['follower_id', 'followed_id'],
+            db.select(follow.c.follower_id, follow.c.followed_id).where(follow.c.followed_id.in_(pulled_ids)),
+        ))
+    return pulled_ids
+
+def add_to_timeline(follower_id, followed_ids):
+    """After new follows: pulled accounts join the follower's pulled list, the others are backfilled by a job."""
+    pull_popular_authors(followed_ids)
+    pulled_ids = set(db.session.scalars(
+        db.select(User.id).where(User.id.in_(followed_ids), User.fanout_pulled)
+    ).all())
+    if pulled_ids:
+        db.session.execute(insert_ignore(pulled_follow).values(
+            [{'follower_id': follower_id, 'followed_id': user_id} for user_id in sorted(pulled_ids)]
+        ))
+    for user_id in followed_ids:
+        if user_id not in pulled_ids:
+            enqueue_job('backfill_timeline', {'follower_id': follower_id, 'followed_id': user_id})
+
+@job_handler('fanout_post')
+def fanout_post(payload):
+    """Copy a new post into every follower's timeline with one INSERT ... SELECT."""
+    post = db.session.get(Post, payload['post_id'])
+    if post is None:
+        return  # deleted before fan-out ran
+    if timeline_insert_from(
+        db.select(follow.c.follower_id, db.literal(post.id), db.literal(post.timestamp))
+        .where(follow.c.followed_id == post.user_id)
+    ):
+        bump_cache_versions(TIMELINE_SCOPE)
+    db.session.commit()
+
+@job_handler('backfill_timeline')
+def backfill_timeline(payload):
+    """After a follow, bring the followed account's recent posts into the follower's timeline."""
+    if not follows(payload['follower_id'], payload['followed_id']):
+        return
+    if timeline_insert_from(
+        db.select(db.literal(payload['follower_id']), Post.id, Post.timestamp)
+        .where(Post.user_id == payload['followed_id'])
+        .order_by(Post.timestamp.desc(), Post.id.desc())
+        .limit(FOLLOW_BACKFILL_POSTS)
+    ):
+        bump_cache_versions(TIMELINE_SCOPE)
+    db.session.commit()
+
+def remove_from_timeline(follower_id, followed_ids):
+    """Drop unfollowed accounts' posts from the follower's timeline, and from their pulled list."""
+    db.session.execute(
+        db.delete(pulled_follow)
+        .where(pulled_follow.c.follower_id == follower_id, pulled_follow.c.followed_id.in_(followed_ids))
+    )
+    db.session.execute(
+        db.delete(TimelineEntry).where(
+            TimelineEntry.user_id == follower_id,
+            TimelineEntry.post_id.in_(db.select(Post.id).where(Post.user_id.in_(followed_ids))),
+        )
+    )
+
+def rebuild_timelines():
+    """
+    Fill timeline_entry from scratch: everyone's own posts plus posts of
+    fanned-out accounts they follow. pulled_follow is rebuilt alongside.
+    """
+    lift_statement_timeout()
+    db.session.execute(db.delete(TimelineEntry))
+    db.session.execute(db.delete(pulled_follow))
+    db.session.execute(db.update(User).where(User.follower_count > FANOUT_FOLLOWER_LIMIT).values(fanout_pulled=True))
+    db.session.execute(insert_ignore(pulled_follow).from_select(
+        ['follower_id', 'followed_id'],
+        db.select(follow.c.follower_id, follow.c.followed_id)
+        .join(User, User.id == follow.c.followed_id)
+        .where(User.fanout_pulled),
+    ))
+    own = timeline_insert_from(db.select(Post.user_id, Post.id, Post.timestamp))
+    followed = timeline_insert_from(
+        db.select(follow.c.follower_id, Post.id, Post.timestamp)
+        .join(Post, Post.user_id == follow.c.followed_id)
+        .join(User, User.id == follow.c.followed_id)
+        .where(~User.fanout_pulled)
+    )
+    bump_cache_versions(TIMELINE_SCOPE)
+    db.session.commit()
+    return own + followed
+
+@app.cli.command('rebuild-timelines')
+def rebuild_timelines_command():
+    """Rebuild every user's following timeline from the post and follow tables."""
+    print(f"Inserted {rebuild_timelines()} timeline entries")
+
+@app.cli.command('run-worker')
+def run_worker_command():
+    """Process background jobs (metadata enrichment, ...) until interrupted."""
+    print("Job worker started")
+    run_job_worker()
+
+# ---------- LIVE EVENTS ----------
+# Writers call publish_event inside their transaction. With EVENT_BRIDGE=memory
+# (one web worker) the event goes to this process's broker right after the
+# commit; with EVENT_BRIDGE=database it is a feed_event row that a poller
+# thread in every worker hands to its own broker, so any worker's SSE clients
+# see writes made on any other worker.
+EVENT_BRIDGE = os.environ.get('EVENT_BRIDGE', 'memory')  # 'memory' or 'database'
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 1.0))  # seconds
+EVENT_RETENTION = timedelta(seconds=int(os.environ.get('EVENT_RETENTION', 3600)))
+EVENT_REORDER_WINDOW = 200  # ids re-checked behind the newest seen, for transactions that commit out of order
+SSE_HEARTBEAT = 15  # seconds between keep-alive comments, so proxies don't close idle streams
+# Open streams per worker. Each holds a request thread (gthread) or greenlet (gevent) while
+# connected, so the cap must leave room for ordinary requests; gunicorn.conf.py sets it
+# from the worker class and thread count.
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', 4))
+SSE_RETRY_AFTER = 30  # seconds a client turned away by the cap should wait
+
+class StreamLimitReached(Exception):
+    """This worker already serves SSE_MAX_SUBSCRIBERS streams."""
+
+class Subscription:
+    """One connected stream's event queue. A subscriber that falls too far behind is dropped."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+class EventBroker:
+    """
+    In-process pub/sub between publishers and this worker's SSE streams.
+    Keeps the last `backlog` events so reconnecting clients can resume
+    from Last-Event-ID.
+    """
+
+    def __init__(self, backlog=500, queue_size=200, max_subscribers=SSE_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.recent = deque(maxlen=backlog)
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def publish(self, kind, data, event_id=None):
+        with self._lock:
+            event = (event_id if event_id is not None else next(self._ids), kind, data)
+            self.recent.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.dropped = True  # the client reconnects and resumes from the backlog
+                self.unsubscribe(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Returns (subscription, backlog, gap): backlog holds buffered events
+        after last_event_id; gap is True when some of them are gone already.
+        Raises StreamLimitReached when max_subscribers streams are open.
+        """
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise StreamLimitReached()
+            self._subscribers.add(subscription)
+            backlog = []
+            gap = False
+            if last_event_id is not None:
+                backlog = [event for event in self.recent if event[0] > last_event_id]
+                gap = bool(self.recent) and self.recent[0][0] > last_event_id + 1
+        return subscription, backlog, gap
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+event_broker = EventBroker()
+_event_bridge_thread = None
+_event_bridge_lock = threading.Lock()
+
+def publish_event(kind, data):
+    """Publish a live event if, and only when, the current transaction commits."""
+    if EVENT_BRIDGE == 'database':
+        db.session.add(FeedEvent(kind=kind, payload=json.dumps(data)))
+    else:
+        db.session.info.setdefault('pending_events', []).append((kind, data))
+
+@sa_event.listens_for(db.session, 'after_commit')
+def _deliver_pending_events(session):
+    for kind, data in session.info.pop('pending_events', []):
+        event_broker.publish(kind, data)
+
+@sa_event.listens_for(db.session, 'after_soft_rollback')
+def _discard_pending_events(session, previous_transaction):
+    session.info.pop('pending_events', None)
+
+def run_event_bridge(stop_event=None):
+    """Hand new feed_event rows to this worker's broker and purge old ones. Must run inside an app context."""
+    last_id = db.session.scalar(db.select(func.max(FeedEvent.id))) or 0
+    seen = set()
+    last_purge = 0
+    while stop_event is None or not stop_event.is_set():
+        rows = []
+        try:
+            rows = db.session.scalars(
+                db.select(FeedEvent)
+                .where(FeedEvent.id > last_id - EVENT_REORDER_WINDOW)
+                .order_by(FeedEvent.id)
+                .limit(1000)
+            ).all()
+            rows = [row for row in rows if row.id not in seen]
+            for row in rows:
+                event_broker.publish(row.kind, json.loads(row.payload), event_id=row.id)
+                seen.add(row.id)
+                last_id = max(last_id, row.id)
+            seen = {event_id for event_id in seen if event_id > last_id - EVENT_REORDER_WINDOW}
+            if time.time() - last_purge > 60:
+                # Always keep the newest row: feed_event tables created without AUTOINCREMENT
+                # would otherwise restart ids at 1 once emptied, below every bridge's last_id
+                db.session.execute(db.delete(FeedEvent).where(
+                    FeedEvent.created_at < datetime.utcnow() - EVENT_RETENTION,
+                    FeedEvent.id < db.select(func.max(FeedEvent.id)).scalar_subquery(),
+                ))
+                db.session.commit()
+                last_purge = time.time()
+        except Exception as e:
+            print(f"Event bridge poll failed: {e}")
+            db.session.rollback()
+        db.session.remove()
+        if not rows:
+            time.sleep(EVENT_POLL_INTERVAL)
+
+def start_event_bridge():
+    """Start this worker's feed_event poller (once per process) when EVENT_BRIDGE=database."""
+    global _event_bridge_thread
+    if EVENT_BRIDGE != 'database':
+        return
+    with _event_bridge_lock:
+        if _event_bridge_thread is not None and _event_bridge_thread.is_alive():
+            return
+
+        def target():
+            with app.app_context():
+                run_event_bridge()
+
+        _event_bridge_thread = threading.Thread(target=target, name='earshot-event-bridge', daemon=True)
+        _event_bridge_thread.start()
+
+def format_sse(event):
+    event_id, kind, data = event
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+# ---------- COMPRESSION ----------
+COMPRESSION_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)  # in order of preference
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes; smaller bodies aren't worth it
+COMPRESS_MIMETYPES = {
+    'application/json', 'application/manifest+json', 'text/html', 'text/css', 'text/plain',
+    'text/javascript', 'application/javascript', 'image/svg+xml',
+}
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.html', '.txt')
+
+def compress(data, encoding, static=False):
+    """Static assets are compressed once, so they get the slowest, smallest settings."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else 5)
+    return gzip.compress(data, compresslevel=9 if static else 6)
+
+@app.after_request
+def compress_response(response):
+    """Compress buffered text responses with the best encoding the client accepts."""
+    if (
+        response.direct_passthrough  # files (static assets are precompressed instead)
+        or response.is_streamed  # generators and event streams must flush as they go
+        or response.mimetype not in COMPRESS_MIMETYPES
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    if request.method == 'HEAD' or response.status_code != 200 or len(response.get_data()) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = request.accept_encodings.best_match(COMPRESSION_ENCODINGS)
+    if encoding is None:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag names one exact byte sequence, so the compressed body needs its own
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+def send_static(filename):
+    """
+    Static files, served from the .br / .gz twin written by `flask
+    compress-static` when the client accepts it and the twin is up to date.
+    """
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if not request.accept_encodings[encoding] or not os.path.isfile(path + suffix):
+            continue
+        if os.path.getmtime(path + suffix) < os.path.getmtime(path):
+            continue  # stale: the source changed since the last compress-static
+        response = send_from_directory(
+            app.static_folder, filename + suffix,
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            max_age=app.get_send_file_max_age(filename),
+        )
+        response.headers['Content-Encoding'] = encoding
+        break
+    else:
+        response = app.send_static_file(filename)
+    if filename.endswith(PRECOMPRESS_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = send_static
+
+@app.cli.command('compress-static')
+def compress_static_command():
+    """Write .gz (and .br, with brotli installed) next to every compressible static file."""
+    written = 0
+    for root, _, files in os.walk(app.static_folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+                if encoding in COMPRESSION_ENCODINGS:
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compress(data, encoding, static=True))
+                    written += 1
+    print(f"Wrote {written} precompressed static files")
+
 # ---------- ROUTES ----------
 @app.route('/')
 def index():
-    posts = Post.query.order_by(Post.timestamp.desc()).limit(50).all()
+    posts = Post.query.options(joinedload(Post.author)).order_by(Post.timestamp.desc()).limit(50).all()
     for p in posts:
         p.username = p.author.username if p.author else "[deleted]"
         p.is_mine = 'user_id' in session and p.user_id == session['user_id']
@@ -351,7 +2124,9 @@ def api_login():
                 if User.query.filter(func.lower(User.username) == new_username).filter(User.id != user.id).first():
                     return jsonify({'error': 'Username already taken'}), 400
                 user.username = new_username
+                bump_cache_versions(GLOBAL_FEED_SCOPE, user_scope(user.id))
                 db.session.commit()
+                forget_user(user.id)
             
             token = create_access_token(identity=str(user.id))
             return jsonify({
@@ -393,150 +2168,482 @@ def api_login():
 @app.route('/api/feed', methods=['GET'])
 @jwt_required()
 def api_feed():
+    """
+    Newest-first feed as a JSON list.
+
+    Query params: type ('global' or 'following'), limit (max 100), and either
+    cursor (page older than X-Next-Cursor) or since (only posts newer than
+    X-Latest-Cursor). Cursors for the next call are returned as headers.
+    fields (comma-separated) and shape=normalized trim the payload, see
+    serialize_feed.
+    """
     feed_type = request.args.get('type', 'global')  # 'global' or 'following'
-    current_user_id = int(get_jwt_identity())
-    current_user = User.query.get(current_user_id)
+    current_user_id = request_user_id()
+    limit = page_limit()
     
-    if feed_type == 'following' and current_user:
-        # Get users that current user follows
-        following_users = current_user.following.all()
-        following_ids = [user.id for user in following_users]
-        following_ids.append(current_user_id)  # Include own posts
-        if following_ids:
-            posts = Post.query.filter(Post.user_id.in_(following_ids)).order_by(Post.timestamp.desc()).limit(100).all()
-        else:
-            # User follows no one, only show their own posts
-            posts = Post.query.filter(Post.user_id == current_user_id).order_by(Post.timestamp.desc()).limit(100).all()
-    else:
-        # Global feed - all posts
-        posts = Post.query.order_by(Post.timestamp.desc()).limit(100).all()
+    cursor = request.args.get('cursor')
+    since = request.args.get('since')
+    try:
+        fields, shape = feed_format_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Only the following feed needs the user row (to fall back to global for a deleted account)
+    if feed_type != 'following' or request_user() is None:
+        # The global feed is the same for everyone, so serve it from the response cache
+        version = cache_versions(GLOBAL_FEED_SCOPE)[GLOBAL_FEED_SCOPE]
+        etag = response_etag('feed:global', version, limit, cursor, since, ','.join(fields), shape)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        cache_key = f"feed:global:{limit}:{cursor}:{since}:{','.join(fields)}:{shape}"
+        cached = response_cache.get(cache_key, version)
+        if cached is _MISSING:
+            try:
+                posts, headers = paginate_posts(Post.query.options(joinedload(Post.author)), cursor=cursor, since=since, limit=limit)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            cached = {'feed': serialize_feed(posts, fields, shape), 'headers': headers}
+            response_cache.set(cache_key, version, cached)
+        return with_etag(jsonify(cached['feed']), etag), 200, cached['headers']
+
+    # Any post, save or rename anywhere bumps the global scope; fan-out bumps the timeline
+    # scope; the viewer's own scope covers their follows and unfollows
+    versions = cache_versions(GLOBAL_FEED_SCOPE, TIMELINE_SCOPE, user_scope(current_user_id))
+    etag = response_etag('feed:following', current_user_id, *versions.values(), limit, cursor, since, ','.join(fields), shape)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    # Fanned-out timeline (own posts + followed accounts), read along its own index
+    query = (
+        Post.query.options(joinedload(Post.author))
+        .join(TimelineEntry, TimelineEntry.post_id == Post.id)
+        .filter(TimelineEntry.user_id == current_user_id)
+    )
+    key = (TimelineEntry.post_timestamp, TimelineEntry.post_id)
+    # Hybrid: very popular accounts aren't fanned out, so merge their posts in here
+    extra_sources = []
+    pulled_ids = pulled_author_ids(current_user_id)
+    if pulled_ids:
+        extra_sources.append((
+            Post.query.options(joinedload(Post.author)).filter(Post.user_id.in_(pulled_ids)),
+            (Post.timestamp, Post.id),
+        ))
+
+    try:
+        posts, headers = paginate_posts(
+            query,
+            cursor=cursor,
+            since=since,
+            limit=limit,
+            key=key,
+            extra_sources=extra_sources,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    feed = []
+    return with_etag(jsonify(serialize_feed(posts, fields, shape)), etag), 200, headers
+
+FEED_ITEM_FIELDS = {
+    'id': lambda p: p.id,
+    'username': lambda p: p.author.username if p.author else '[deleted]',
+    'title': lambda p: p.title,
+    'artist': lambda p: p.artist,
+    'thumbnail': lambda p: p.thumbnail,
+    'url': lambda p: p.url,
+    'createdAt': lambda p: p.timestamp.isoformat(),
+    'save_count': lambda p: p.save_count,
+    'status': lambda p: p.status,
+}
+TRACK_FIELDS = ('title', 'artist', 'thumbnail', 'status')  # the same for every post of a track
+
+def feed_format_args():
+    """
+    (fields, shape) from ?fields=id,title,... and ?shape=flat|normalized.
+    Raises ValueError on unknown names. 'id' is always included.
+    """
+    fields = tuple(FEED_ITEM_FIELDS)
+    if request.args.get('fields'):
+        requested = set(request.args['fields'].split(','))
+        unknown = requested - set(FEED_ITEM_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        fields = tuple(name for name in FEED_ITEM_FIELDS if name in requested or name == 'id')
+    shape = request.args.get('shape', 'flat')
+    if shape not in ('flat', 'normalized'):
+        raise ValueError(f"Unknown shape: {shape!r}")
+    return fields, shape
+
+def format_feed_item(p, fields=tuple(FEED_ITEM_FIELDS)):
+    return {name: FEED_ITEM_FIELDS[name](p) for name in fields}
+
+def serialize_feed(posts, fields=tuple(FEED_ITEM_FIELDS), shape='flat'):
+    """
+    flat: a list of feed items with the selected fields.
+    normalized: {'items', 'users', 'tracks'}. Items reference their author by
+    'user' and their shared track by 'track'; usernames and track metadata
+    appear once in the side tables, keyed by id. Legacy posts without a track
+    keep the track fields inline.
+    """
+    if shape == 'flat':
+        return [format_feed_item(p, fields) for p in posts]
+
+    item_fields = [name for name in fields if name not in TRACK_FIELDS and name != 'username']
+    track_fields = [name for name in fields if name in TRACK_FIELDS]
+    items, users, tracks = [], {}, {}
     for p in posts:
+        item = format_feed_item(p, item_fields)
+        item['user'] = p.user_id
+        if 'username' in fields and str(p.user_id) not in users:
+            users[str(p.user_id)] = {'username': FEED_ITEM_FIELDS['username'](p)}
+        if p.track_id is not None:
+            item['track'] = p.track_id
+            if track_fields and str(p.track_id) not in tracks:
+                tracks[str(p.track_id)] = format_feed_item(p, track_fields)
+        else:
+            item.update(format_feed_item(p, track_fields))
+        items.append(item)
+    return {'items': items, 'users': users, 'tracks': tracks}
+
+@app.route('/api/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def api_stream():
+    """
+    Server-Sent Events instead of polling /api/feed. Events:
+      - post:       a new post, shaped like a feed item plus its user_id
+      - save_count: {"id", "save_count"} when a post is saved or unsaved
+      - reset:      events were missed; refetch the feed
+
+    ?type=following limits post events to the viewer and accounts they
+    follow (as of connecting). Reconnects resume after Last-Event-ID.
+    EventSource can't send headers, so the token may also be given as ?jwt=.
+    Each open stream holds a worker thread, so streams per worker are capped
+    (SSE_MAX_SUBSCRIBERS); past the cap this answers 503 with Retry-After
+    and the client should keep polling /api/feed meanwhile.
+    """
+    current_user_id = request_user_id()
+    authors = None
+    if request.args.get('type') == 'following':
+        authors = set(db.session.scalars(db.select(follow.c.followed_id).where(follow.c.follower_id == current_user_id)))
+        authors.add(current_user_id)
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    db.session.remove()  # don't hold a pooled connection for the life of the stream
+    start_event_bridge()
+    try:
+        subscription, backlog, gap = event_broker.subscribe(last_event_id)
+    except StreamLimitReached:
+        response = jsonify({'error': 'Too many open streams, retry later'})
+        response.headers['Retry-After'] = str(SSE_RETRY_AFTER)
+        return response, 503
+
+    def wanted(event):
+        return authors is None or event[1] != 'post' or event[2].get('user_id') in authors
+
+    def stream():
         try:
-            # Try to get save count, default to 0 if crate table doesn't exist yet
-            save_count = db.session.query(crate).filter_by(post_id=p.id).count()
-        except Exception as e:
-            print(f"Error querying crate table: {e}")
-            save_count = 0  # Default to 0 if table doesn't exist
-        feed.append({
-            'id': p.id,
-            'username': p.author.username if p.author else '[deleted]',
-            'title': p.title,
-            'artist': p.artist,
-            'thumbnail': p.thumbnail,
-            'url': p.url,
-            'createdAt': p.timestamp.isoformat(),
-            'save_count': save_count,
-        })
-    return jsonify(feed)
+            yield f"retry: {int(EVENT_POLL_INTERVAL * 1000) + 2000}\n\n"
+            if gap:
+                yield "event: reset\ndata: {}\n\n"
+            for event in backlog:
+                if wanted(event):
+                    yield format_sse(event)
+            while not subscription.dropped:
+                try:
+                    event = subscription.queue.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if wanted(event):
+                    yield format_sse(event)
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # nginx: pass events through unbuffered
+    })
 
 @app.route('/api/post', methods=['POST'])
 @jwt_required()
 def api_post():
-    user_id = get_jwt_identity()
+    user_id = request_user_id()
     data = request.get_json()
     url = data.get('url', '').strip()
-    platform, info = parse_track_url(url)
-    if not info:
+    track = get_or_create_track(url)
+    if not track:
         return jsonify({'error': 'Unsupported URL'}), 400
 
+    key = track_key_for_url(url)
+    already_posted = db.session.query(Post.query.filter_by(track_key=key).exists()).scalar()
     post = Post(
         user_id=user_id,
         url=url,
-        title=info['title'],
-        artist=info.get('artist'),
-        thumbnail=info['thumbnail'],
-        embed_url=info['embed_url'],
-        platform=platform
+        track_key=key,
+        is_first_discover=not already_posted,
+        track=track,
+        platform=track.platform
     )
     db.session.add(post)
+    db.session.flush()
+    # Own timeline synchronously so the poster sees it at once; followers via a job
+    db.session.add(TimelineEntry(user_id=post.user_id, post_id=post.id, post_timestamp=post.timestamp))
+    author = db.session.get(User, post.user_id)
+    if author.follower_count > 0 and not author.fanout_pulled:
+        enqueue_job('fanout_post', {'post_id': post.id})
+    bump_cache_versions(GLOBAL_FEED_SCOPE, user_scope(post.user_id))
+    publish_event('post', {**format_feed_item(post), 'user_id': post.user_id})
     db.session.commit()
+    wake_job_worker()
 
-    return jsonify({'success': True, 'post': {'id': post.id, 'title': post.title}})
+    status_code = 202 if post.status == 'pending' else 200
+    return jsonify({'success': True, 'post': {'id': post.id, 'title': post.title, 'status': post.status}}), status_code
+
+@app.route('/api/post/<int:post_id>', methods=['GET'])
+def api_get_post(post_id):
+    """Single post, for polling a pending post until its metadata is ready."""
+    post = Post.query.get_or_404(post_id)
+    return jsonify({
+        'id': post.id,
+        'username': post.author.username if post.author else '[deleted]',
+        'title': post.title,
+        'artist': post.artist,
+        'thumbnail': post.thumbnail,
+        'embed_url': post.embed_url,
+        'url': post.url,
+        'createdAt': post.timestamp.isoformat(),
+        'save_count': post.save_count,
+        'status': post.status,
+    })
 
 # ---------- NEW: PROFILE + FOLLOW ----------
 @app.route('/api/profile/<username>', methods=['GET'])
 def api_profile(username):
-    user = User.query.filter(func.lower(User.username) == username.lower()).first_or_404()
-    posts = Post.query.filter_by(user_id=user.id).order_by(Post.timestamp.desc()).all()
+    """
+    Profile header plus the first PROFILE_PAGE_SIZE posts and crate items.
+    posts_cursor / crate_cursor (null when there is nothing more) continue
+    through /api/profile/<username>/posts and /api/profile/<username>/crate.
+    """
+    user_id = profile_user_id(username)
+
+    # Optional JWT: the viewer decides is_own_profile / is_following
+    current_user_id = request_user_id()
+
+    # A follow or unfollow bumps the followed user's scope too, so this version covers is_following
+    version = cache_versions(user_scope(user_id))[user_scope(user_id)]
+    profile = response_cache.get(f'profile:{user_id}', version)
+    if profile is _MISSING:
+        profile = build_profile(db.session.get(User, user_id))
+        response_cache.set(f'profile:{user_id}', version, profile)
+    profile = dict(profile)
+    crate_page = crate_items(profile.pop('crate_ids'))
+
+    # The live crate items are part of the ETag, since the version doesn't cover them
+    etag = response_etag('profile', user_id, version, current_user_id, crate_page)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    # Viewer-specific fields are never cached
+    is_own_profile = (current_user_id == user_id)
+    is_following = bool(current_user_id) and not is_own_profile and follows(current_user_id, user_id)
+
+    response = jsonify({
+        **profile, 'crate': crate_page, 'is_own_profile': is_own_profile, 'is_following': is_following,
+    })
+    return with_etag(response, etag)
+
+def profile_user_id(username):
+    """Id of the user with this username (case-insensitive), or 404."""
+    user_id = db.session.scalar(db.select(User.id).where(func.lower(User.username) == username.lower()))
+    if user_id is None:
+        abort(404)
+    return user_id
+
+def format_profile_post(p):
+    return {
+        'id': p.id,
+        'title': p.title,
+        'artist': p.artist,
+        'thumbnail': p.thumbnail,
+        'url': p.url,
+        'createdAt': p.timestamp.isoformat(),
+        'is_first_discover': p.is_first_discover,
+        'save_count': p.save_count,
+        'status': p.status,
+    }
+
+def build_profile(user):
+    """The viewer-independent part of a profile response, as cached by api_profile."""
+    posts, posts_headers = paginate_posts(Post.query.filter_by(user_id=user.id), limit=PROFILE_PAGE_SIZE)
     try:
-        crate_posts = user.saved_posts.order_by(crate.c.saved_at.desc()).all()
+        crate_posts, crate_headers = paginate_crate(user.id, limit=PROFILE_PAGE_SIZE)
     except Exception as e:
         print(f"Error loading crate posts (table may not exist): {e}")
-        crate_posts = []  # Default to empty if table doesn't exist
-    
-    # Check if this is the current user's own profile (optional JWT)
-    is_own_profile = False
-    is_following = False
-    try:
-        verify_jwt_in_request(optional=True)
-        current_user_id = get_jwt_identity()
-        if current_user_id:
-            current_user_id = int(current_user_id)
-            is_own_profile = (current_user_id == user.id)
-            if not is_own_profile:
-                current_user = User.query.get(current_user_id)
-                if current_user:
-                    is_following = current_user.is_following(user)
-    except:
-        pass  # Not logged in or invalid token
-
-    def format_post(p):
-        try:
-            save_count = db.session.query(crate).filter_by(post_id=p.id).count()
-        except Exception as e:
-            print(f"Error querying crate table: {e}")
-            save_count = 0  # Default to 0 if table doesn't exist
-        return {
-            'id': p.id,
-            'title': p.title,
-            'artist': p.artist,
-            'thumbnail': p.thumbnail,
-            'url': p.url,
-            'createdAt': p.timestamp.isoformat(),
-            'is_first_discover': Post.query.filter_by(url=p.url).count() == 1,
-            'save_count': save_count
-        }
+        db.session.rollback()
+        crate_posts, crate_headers = [], {}  # Default to empty if table doesn't exist
 
-    return jsonify({
+    return {
         'user': {
             'id': user.id,
             'username': user.username,
             'twitter': user.twitter or '',
-            'followers': user.followers.count(),
-            'following': user.following.count(),
+            'followers': user.follower_count,
+            'following': user.following_count,
         },
-        'is_own_profile': is_own_profile,
-        'is_following': is_following,
-        'posts': [format_post(p) for p in posts],
-        'crate': [format_post(p) for p in crate_posts]
-    })
+        'posts': [format_profile_post(p) for p in posts],
+        'posts_cursor': posts_headers.get('X-Next-Cursor'),
+        'crate_ids': [p.id for p in crate_posts],  # rendered per request by crate_items
+        'crate_cursor': crate_headers.get('X-Next-Cursor'),
+    }
+
+def crate_items(post_ids):
+    """
+    Crate entries rendered from the live posts, in the given order. Saved
+    posts belong to other authors, so caching their save_count or track
+    fields would mean bumping every saver on each save; one query per page
+    instead. Posts deleted since the ids were read are skipped.
+    """
+    posts = {p.id: p for p in Post.query.filter(Post.id.in_(post_ids))} if post_ids else {}
+    return [format_profile_post(posts[post_id]) for post_id in post_ids if post_id in posts]
+
+@app.route('/api/profile/<username>/posts', methods=['GET'])
+def api_profile_posts(username):
+    """
+    A page of the user's posts, newest first. Query params: limit (max 100),
+    cursor (X-Next-Cursor of the previous page, or posts_cursor from the profile).
+    """
+    user_id = profile_user_id(username)
+    cursor = request.args.get('cursor')
+    limit = page_limit(PROFILE_PAGE_SIZE)
+    version = cache_versions(user_scope(user_id))[user_scope(user_id)]
+    etag = response_etag('profile:posts', user_id, version, limit, cursor)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    try:
+        posts, headers = paginate_posts(Post.query.filter_by(user_id=user_id), cursor=cursor, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return with_etag(jsonify([format_profile_post(p) for p in posts]), etag), 200, headers
+
+@app.route('/api/profile/<username>/crate', methods=['GET'])
+def api_profile_crate(username):
+    """
+    A page of the user's crate, most recently saved first. Query params: limit
+    (max 100), cursor (X-Next-Cursor of the previous page, or crate_cursor from the profile).
+    """
+    user_id = profile_user_id(username)
+    cursor = request.args.get('cursor')
+    limit = page_limit(PROFILE_PAGE_SIZE)
+    try:
+        posts, headers = paginate_crate(user_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    items = [format_profile_post(p) for p in posts]
+    # Other authors' posts: their save counts and metadata change without bumping this user's scope
+    etag = response_etag('profile:crate', user_id, limit, cursor, items)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    return with_etag(jsonify(items), etag), 200, headers
 
 @app.route('/api/follow/<int:user_id>', methods=['POST'])
 @jwt_required()
 def api_follow(user_id):
-    current_user = User.query.get(get_jwt_identity())
+    current_user = request_user()
+    if current_user is None:
+        abort(404)
     target = User.query.get_or_404(user_id)
     if current_user.id == target.id:
         return jsonify({'error': 'Cannot follow self'}), 400
 
-    if current_user.is_following(target):
-        current_user.unfollow(target)
+    # Toggle: the DELETE doubles as the membership check
+    if current_user.unfollow(target):
+        remove_from_timeline(current_user.id, [target.id])
         action = 'unfollowed'
     else:
         current_user.follow(target)
+        add_to_timeline(current_user.id, [target.id])
         action = 'followed'
+    bump_cache_versions(user_scope(current_user.id), user_scope(target.id))  # following / follower counts
+    db.session.commit()
+    wake_job_worker()
+
+    return jsonify({'action': action, 'followers': target.follower_count})
+
+@app.route('/api/follow/batch', methods=['POST'])
+@jwt_required()
+def api_follow_batch():
+    """
+    Set the follow state of many accounts in one transaction.
+
+    Body: {"follow": [user ids], "unfollow": [user ids]}. Idempotent: ids
+    already in the requested state are left alone. Returns how many rows
+    changed, the resulting follower count of every requested account that
+    exists, and the caller's following count.
+    """
+    current_user_id = request_user_id()
+    try:
+        to_follow, to_unfollow = batch_ids(request.get_json(silent=True) or {}, 'follow', 'unfollow')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if current_user_id in to_follow:
+        return jsonify({'error': 'Cannot follow self'}), 400
+
+    known = dict(db.session.execute(
+        db.select(User.id, User.follower_count).where(User.id.in_(to_follow | to_unfollow))
+    ).all())
+    followed = []
+    if to_follow & known.keys():
+        followed = db.session.scalars(
+            insert_ignore(follow)
+            .values([{'follower_id': current_user_id, 'followed_id': user_id} for user_id in sorted(to_follow & known.keys())])
+            .returning(follow.c.followed_id)
+        ).all()
+    unfollowed = []
+    if to_unfollow:
+        unfollowed = db.session.scalars(
+            db.delete(follow)
+            .where(follow.c.follower_id == current_user_id, follow.c.followed_id.in_(to_unfollow))
+            .returning(follow.c.followed_id)
+        ).all()
+
+    if followed:
+        db.session.execute(
+            db.update(User).where(User.id.in_(followed)).values(follower_count=User.follower_count + 1)
+        )
+        add_to_timeline(current_user_id, followed)
+    if unfollowed:
+        db.session.execute(
+            db.update(User).where(User.id.in_(unfollowed)).values(follower_count=User.follower_count - 1)
+        )
+        remove_from_timeline(current_user_id, unfollowed)
+    if followed or unfollowed:
+        db.session.execute(
+            db.update(User).where(User.id == current_user_id)
+            .values(following_count=User.following_count + len(followed) - len(unfollowed))
+        )
+        bump_cache_versions(user_scope(current_user_id), *[user_scope(user_id) for user_id in followed + unfollowed])
     db.session.commit()
+    wake_job_worker()
 
-    return jsonify({'action': action, 'followers': target.followers.count()})
+    followers = dict(db.session.execute(
+        db.select(User.id, User.follower_count).where(User.id.in_(known.keys()))
+    ).all())
+    return jsonify({
+        'followed': len(followed),
+        'unfollowed': len(unfollowed),
+        'missing': sorted((to_follow | to_unfollow) - known.keys()),
+        'followers': {str(user_id): count for user_id, count in followers.items()},
+        'following': db.session.scalar(db.select(User.following_count).where(User.id == current_user_id)),
+    })
 
 # ---------- DELETE POST ----------
 @app.route('/api/post/<int:post_id>', methods=['DELETE'])
 @jwt_required()
 def api_delete_post(post_id):
     """Delete a post. Only the post owner can delete their own posts."""
-    current_user_id = int(get_jwt_identity())
+    current_user_id = request_user_id()
     post = Post.query.get_or_404(post_id)
     
     # Check if the current user owns this post
@@ -544,6 +2651,19 @@ def api_delete_post(post_id):
         return jsonify({'error': 'Unauthorized. You can only delete your own posts.'}), 403
     
     # Delete the post
+    if post.is_first_discover and post.track_key:
+        # Hand the first-discover badge to the next earliest post of the same track
+        successor = (
+            Post.query.filter(Post.track_key == post.track_key, Post.id != post.id)
+            .order_by(Post.id.asc())
+            .first()
+        )
+        if successor:
+            successor.is_first_discover = True
+            bump_post_cache_versions([successor.id])  # the badge moved onto the successor
+    db.session.execute(db.delete(TimelineEntry).where(TimelineEntry.post_id == post.id))
+    # Savers' crates drop the post by themselves: crate items are rendered live
+    bump_cache_versions(GLOBAL_FEED_SCOPE, user_scope(post.user_id))
     db.session.delete(post)
     db.session.commit()
     
@@ -554,66 +2674,154 @@ def api_delete_post(post_id):
 @jwt_required()
 def api_me():
     """Get the current authenticated user's information."""
-    current_user_id = int(get_jwt_identity())
-    current_user = User.query.get_or_404(current_user_id)
+    current_user_id = request_user_id()
+    etag = response_etag('me', current_user_id, *cache_versions(user_scope(current_user_id)).values())
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    # Always the live row, not the identity cache: clients keep this body under the version ETag
+    current_user = db.session.get(User, current_user_id) or abort(404)
     
-    return jsonify({
+    return with_etag(jsonify({
         'id': current_user.id,
         'username': current_user.username,
         'twitter': current_user.twitter,
-    })
+    }), etag)
 
 # ---------- CRATE (SAVE POSTS) ----------
+def save_to_crate(user_id, post):
+    """Add post to the user's crate with one INSERT; True if it wasn't there already."""
+    saved = db.session.execute(
+        insert_ignore(crate).values(user_id=user_id, post_id=post.id, saved_at=datetime.utcnow())
+    ).rowcount == 1
+    if saved:
+        count = db.session.execute(
+            db.update(Post).where(Post.id == post.id).values(save_count=Post.save_count + 1).returning(Post.save_count)
+        ).scalar_one()
+        bump_post_cache_versions([post.id], user_scope(user_id))  # the saver's crate gained this post
+        publish_event('save_count', {'id': post.id, 'save_count': count})
+    return saved
+
+def remove_from_crate(user_id, post):
+    """Remove post from the user's crate with one DELETE; True if it was there."""
+    removed = db.session.execute(
+        db.delete(crate).where(crate.c.user_id == user_id, crate.c.post_id == post.id)
+    ).rowcount == 1
+    if removed:
+        count = db.session.execute(
+            db.update(Post).where(Post.id == post.id).values(save_count=Post.save_count - 1).returning(Post.save_count)
+        ).scalar_one()
+        bump_post_cache_versions([post.id], user_scope(user_id))  # the unsaver's crate lost this post
+        publish_event('save_count', {'id': post.id, 'save_count': count})
+    return removed
+
 @app.route('/api/crate/<int:post_id>', methods=['POST', 'DELETE'])
 @jwt_required()
 def api_crate(post_id):
     """Save or unsave a post to/from crate."""
-    current_user_id = int(get_jwt_identity())
-    current_user = User.query.get_or_404(current_user_id)
+    current_user_id = request_user_id()
+    current_user = request_user() or abort(404)
     post = Post.query.get_or_404(post_id)
     
     try:
         if request.method == 'POST':
             # Save to crate
             try:
-                if post not in current_user.saved_posts.all():
-                    current_user.saved_posts.append(post)
-                    db.session.commit()
+                save_to_crate(current_user.id, post)
+                db.session.commit()
             except Exception as e:
+                db.session.rollback()
                 print(f"Error saving to crate (table may not exist): {e}")
                 return jsonify({'error': 'Crate feature not available yet. Database migration needed.'}), 503
-            try:
-                save_count = db.session.query(crate).filter_by(post_id=post_id).count()
-            except Exception:
-                save_count = 0
-            return jsonify({'success': True, 'saved': True, 'save_count': save_count})
+            return jsonify({'success': True, 'saved': True, 'save_count': post.save_count})
         else:
             # DELETE - Remove from crate
             try:
-                if post in current_user.saved_posts.all():
-                    current_user.saved_posts.remove(post)
-                    db.session.commit()
+                remove_from_crate(current_user.id, post)
+                db.session.commit()
             except Exception as e:
+                db.session.rollback()
                 print(f"Error removing from crate (table may not exist): {e}")
                 return jsonify({'error': 'Crate feature not available yet. Database migration needed.'}), 503
-            try:
-                save_count = db.session.query(crate).filter_by(post_id=post_id).count()
-            except Exception:
-                save_count = 0
-            return jsonify({'success': True, 'saved': False, 'save_count': save_count})
+            return jsonify({'success': True, 'saved': False, 'save_count': post.save_count})
     except Exception as e:
         print(f"Error in crate endpoint: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/crate/batch', methods=['POST'])
+@jwt_required()
+def api_crate_batch():
+    """
+    Set the crate state of many posts in one transaction.
+
+    Body: {"save": [post ids], "unsave": [post ids]}. Idempotent: posts
+    already in the requested state are left alone. Returns how many rows
+    changed, ids of posts that don't exist, and the resulting save_count of
+    every requested post that does.
+    """
+    current_user_id = request_user_id()
+    try:
+        to_save, to_unsave = batch_ids(request.get_json(silent=True) or {}, 'save', 'unsave')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    authors = dict(db.session.execute(
+        db.select(Post.id, Post.user_id).where(Post.id.in_(to_save | to_unsave))
+    ).all())
+    saved = []
+    if to_save & authors.keys():
+        saved = db.session.scalars(
+            insert_ignore(crate)
+            .values([
+                {'user_id': current_user_id, 'post_id': post_id, 'saved_at': datetime.utcnow()}
+                for post_id in sorted(to_save & authors.keys())
+            ])
+            .returning(crate.c.post_id)
+        ).all()
+    unsaved = []
+    if to_unsave:
+        unsaved = db.session.scalars(
+            db.delete(crate)
+            .where(crate.c.user_id == current_user_id, crate.c.post_id.in_(to_unsave))
+            .returning(crate.c.post_id)
+        ).all()
+
+    changed_counts = []
+    if saved:
+        changed_counts += db.session.execute(
+            db.update(Post).where(Post.id.in_(saved)).values(save_count=Post.save_count + 1)
+            .returning(Post.id, Post.save_count)
+        ).all()
+    if unsaved:
+        changed_counts += db.session.execute(
+            db.update(Post).where(Post.id.in_(unsaved)).values(save_count=Post.save_count - 1)
+            .returning(Post.id, Post.save_count)
+        ).all()
+    for post_id, count in changed_counts:
+        publish_event('save_count', {'id': post_id, 'save_count': count})
+    if saved or unsaved:
+        bump_post_cache_versions(saved + unsaved, user_scope(current_user_id))
+    db.session.commit()
+
+    save_counts = dict(db.session.execute(
+        db.select(Post.id, Post.save_count).where(Post.id.in_(authors.keys()))
+    ).all())
+    return jsonify({
+        'saved': len(saved),
+        'unsaved': len(unsaved),
+        'missing': sorted((to_save | to_unsave) - authors.keys()),
+        'save_counts': {str(post_id): count for post_id, count in save_counts.items()},
+    })
+
 # ---------- UPDATE USERNAME ----------
 @app.route('/api/profile/username', methods=['PUT'])
 @jwt_required()
 def api_update_username():
     """Update the current user's username."""
-    current_user_id = int(get_jwt_identity())
-    current_user = User.query.get_or_404(current_user_id)
+    current_user_id = request_user_id()
+    current_user = request_user() or abort(404)
     
     data = request.get_json()
     new_username = data.get('username', '').strip().lower()
@@ -627,14 +2835,266 @@ def api_update_username():
         return jsonify({'error': 'Username already taken'}), 400
     
     current_user.username = new_username
+    # Usernames appear on every global feed item and on the profile itself
+    bump_cache_versions(GLOBAL_FEED_SCOPE, user_scope(current_user_id))
     db.session.commit()
+    forget_user(current_user_id)
     
     return jsonify({
         'success': True,
         'username': current_user.username
     })
 
+# ---------- METADATA CACHE STATS + METRICS ----------
+@app.route('/api/metadata-cache/stats', methods=['GET'])
+def metadata_cache_stats():
+    """Hit/miss counters of this worker's metadata cache."""
+    return jsonify(metadata_cache.stats)
+
+@app.route('/api/response-cache/stats', methods=['GET'])
+def response_cache_stats():
+    """Hit/miss counters of this worker's response cache."""
+    return jsonify(response_cache.stats)
+
+def metrics_gauges():
+    """Cache, breaker, live-stream and job-queue state for /metrics, in MetricsRegistry.render's family format."""
+    gauges = [
+        ('earshot_metadata_cache_events_total', 'counter', 'Metadata cache lookups by outcome.',
+         [({'event': event}, count) for event, count in sorted(metadata_cache.stats.items())]),
+        ('earshot_response_cache_events_total', 'counter', 'Response cache lookups by outcome.',
+         [({'event': event}, count) for event, count in sorted(response_cache.stats.items())]),
+        ('earshot_circuit_open', 'gauge', 'Whether a provider circuit breaker is open or half-open.',
+         [({'provider': name}, int(breaker.state != 'closed')) for name, breaker in sorted(PROVIDER_BREAKERS.items())]),
+        ('earshot_circuit_failures', 'gauge', 'Consecutive transient failures per provider.',
+         [({'provider': name}, breaker.failures) for name, breaker in sorted(PROVIDER_BREAKERS.items())]),
+        ('earshot_stream_subscribers', 'gauge', 'Open /api/stream connections in this worker.',
+         [({}, event_broker.subscriber_count)]),
+    ]
+    try:
+        jobs = db.session.execute(db.select(Job.status, func.count()).group_by(Job.status)).all()
+        gauges.append(('earshot_jobs', 'gauge', 'Background jobs by status.', [({'status': status}, count) for status, count in jobs]))
+    except Exception as e:
+        db.session.rollback()
+        print(f"Metrics could not count jobs: {e}")
+    return gauges
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint for this worker; 404 unless METRICS=1."""
+    if not METRICS_ENABLED:
+        abort(404)
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        abort(401)
+    return Response(metrics_registry.render(metrics_gauges()), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('purge-metadata-cache')
+def purge_metadata_cache_command():
+    """Delete expired entries from the shared metadata cache store."""
+    if metadata_cache.shared is None:
+        print("No shared metadata cache store configured")
+        return
+    print(f"Purged {metadata_cache.shared.purge_expired()} expired metadata cache entries")
+
+# ---------- QUERY PLAN CHECKS ----------
+def hot_queries():
+    """(name, statement) for each query pattern on a hot path; every one must be index-served."""
+    position = tuple_(datetime(2025, 1, 1), 1)
+    return [
+        ('user by username', db.select(User.id).where(func.lower(User.username) == 'someone')),
+        ('global feed', db.select(Post.id).order_by(Post.timestamp.desc(), Post.id.desc()).limit(100)),
+        ('global feed page', db.select(Post.id).where(tuple_(Post.timestamp, Post.id) < position)
+            .order_by(Post.timestamp.desc(), Post.id.desc()).limit(100)),
+        ('following timeline', db.select(Post.id).join(TimelineEntry, TimelineEntry.post_id == Post.id)
+            .where(TimelineEntry.user_id == 1)
+            .order_by(TimelineEntry.post_timestamp.desc(), TimelineEntry.post_id.desc()).limit(100)),
+        ('pulled authors', db.select(pulled_follow.c.followed_id).where(pulled_follow.c.follower_id == 1)),
+        ('pulled author posts', db.select(Post.id).where(Post.user_id.in_([1, 2]))
+            .order_by(Post.timestamp.desc(), Post.id.desc()).limit(100)),
+        ('profile posts', db.select(Post.id).where(Post.user_id == 1)
+            .order_by(Post.timestamp.desc(), Post.id.desc()).limit(100)),
+        ('profile crate', db.select(Post.id).join(crate, crate.c.post_id == Post.id)
+            .where(crate.c.user_id == 1, tuple_(crate.c.saved_at, crate.c.post_id) < position)
+            .order_by(crate.c.saved_at.desc(), crate.c.post_id.desc()).limit(100)),
+        ('save count', db.select(func.count()).select_from(crate).where(crate.c.post_id == 1)),
+        ('crate membership', db.select(crate).where(crate.c.user_id == 1, crate.c.post_id == 1).exists().select()),
+        ('follow membership', db.select(follow).where(follow.c.follower_id == 1, follow.c.followed_id == 2).exists().select()),
+        ('follower count', db.select(func.count()).select_from(follow).where(follow.c.followed_id == 1)),
+        ('fan-out followers', db.select(follow.c.follower_id).where(follow.c.followed_id == 1)),
+        ('first discover', db.select(Post.id).where(Post.track_key == 'spotify:x').limit(1)),
+        ('track by platform id', db.select(Track.id).where(Track.platform == 'spotify', Track.native_id == 'x')),
+        ('timeline cleanup', db.select(TimelineEntry.user_id).where(TimelineEntry.post_id == 1)),
+        ('due jobs', db.select(Job.id).where(Job.status == 'queued', Job.run_after <= datetime(2025, 1, 1))
+            .order_by(Job.id).limit(10)),
+    ]
+
+def query_plan(conn, sql, params=()):
+    """SQLite's EXPLAIN QUERY PLAN for one statement, as its step descriptions."""
+    return [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params)]
+
+def full_table_scans(sql, plan):
+    """
+    The steps of `sql`'s query plan that read a whole table or index. Walking
+    an index in its order only counts as served under a LIMIT (a feed page),
+    which stops the walk early; a SCAN of a covering index is otherwise as
+    slow as a table scan.
+    """
+    bounded = ' LIMIT ' in ' '.join(sql.split()).upper()
+    return [
+        step for step in plan
+        if step.startswith('SCAN ') and 'CONSTANT ROW' not in step and not (bounded and ' USING ' in step)
+    ]
+
+def check_query_plans():
+    """
+    EXPLAIN QUERY PLAN every hot query against an empty in-memory SQLite
+    schema built from the models, so the result depends only on the
+    model-level indexes. Returns [(name, ok, plan_lines)]; a query is not ok
+    when its plan has full_table_scans.
+    """
+    engine = sa_create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    results = []
+    with engine.connect() as conn:
+        for name, stmt in hot_queries():
+            compiled = stmt.compile(engine, compile_kwargs={'render_postcompile': True})
+            params = tuple(compiled.params[key] for key in compiled.positiontup)
+            plan = query_plan(conn, str(compiled), params)
+            results.append((name, not full_table_scans(str(compiled), plan), plan))
+    engine.dispose()
+    return results
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot endpoint query would need a full table scan."""
+    failures = 0
+    for name, ok, plan in check_query_plans():
+        print(f"{'ok  ' if ok else 'SCAN'} {name}: {' / '.join(plan)}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} hot queries degrade to a full table scan")
+
 # ---------- DATABASE MIGRATION ----------
+def attach_posts_to_tracks():
+    """
+    Point every post without a track_id at its shared Track, creating tracks
+    from the post's own legacy metadata (no network). Runs in id-ordered
+    batches. Returns (posts_attached, tracks_touched, unparseable_posts).
+    """
+    track_ids = {}  # (platform, native_id) -> track.id, avoids re-querying repeated songs
+    attached = skipped = 0
+    last_id = 0
+    while True:
+        posts = (
+            Post.query.filter(Post.track_id.is_(None), Post.id > last_id)
+            .order_by(Post.id)
+            .limit(500)
+            .all()
+        )
+        if not posts:
+            break
+        for post in posts:
+            platform, native_id = extract_track_id(post.url or '')
+            if not native_id:
+                skipped += 1
+                continue
+            key = (platform, native_id)
+            if key not in track_ids:
+                track = Track.query.filter_by(platform=platform, native_id=native_id).first()
+                if not track:
+                    # Seed the shared row from the post's own legacy metadata (no network)
+                    track = Track(
+                        platform=platform,
+                        native_id=native_id,
+                        title=post._title,
+                        artist=post._artist,
+                        thumbnail=post._thumbnail,
+                        embed_url=post._embed_url,
+                    )
+                    db.session.add(track)
+                    db.session.flush()
+                track_ids[key] = track.id
+            post.track_id = track_ids[key]
+            attached += 1
+        db.session.commit()
+        last_id = posts[-1].id
+    return attached, len(track_ids), skipped
+
+def ensure_columns(table, results):
+    """ALTER TABLE ... ADD COLUMN for every model column missing from the live table."""
+    existing = {c['name'] for c in inspect(db.engine).get_columns(table.name)}
+    preparer = db.engine.dialect.identifier_preparer
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(column.name)} "
+        ddl += column.type.compile(dialect=db.engine.dialect)
+        if column.server_default is not None:
+            default = column.server_default.arg
+            if isinstance(default, str):
+                default = db.literal(default)  # plain-string defaults render as quoted literals
+            ddl += f" DEFAULT {default.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+        db.session.execute(text(ddl))
+        results.append(f'{table.name}.{column.name} column added')
+    db.session.commit()
+
+def reconcile_counts():
+    """
+    Rebuild the denormalized save/follower/following counters from the crate
+    and follow tables. Only rows whose counters were wrong are written (and
+    their cached responses invalidated); returns how many of each.
+    """
+    lift_statement_timeout()
+    saves = (
+        db.select(func.count()).select_from(crate)
+        .where(crate.c.post_id == Post.id).scalar_subquery()
+    )
+    followers = (
+        db.select(func.count()).select_from(follow)
+        .where(follow.c.followed_id == User.id).scalar_subquery()
+    )
+    following = (
+        db.select(func.count()).select_from(follow)
+        .where(follow.c.follower_id == User.id).scalar_subquery()
+    )
+    post_ids = db.session.scalars(
+        db.update(Post).where(Post.save_count != saves).values(save_count=saves).returning(Post.id)
+    ).all()
+    user_ids = db.session.scalars(
+        db.update(User)
+        .where(db.or_(User.follower_count != followers, User.following_count != following))
+        .values(follower_count=followers, following_count=following)
+        .returning(User.id)
+    ).all()
+    if post_ids:
+        bump_post_cache_versions(post_ids)
+    if user_ids:
+        pull_popular_authors(user_ids)
+        bump_cache_versions(*[user_scope(user_id) for user_id in user_ids])
+    db.session.commit()
+    for user_id in user_ids:
+        forget_user(user_id)
+    return {'posts': len(post_ids), 'users': len(user_ids)}
+
+@app.cli.command('reconcile-counts')
+def reconcile_counts_command():
+    """Rebuild save_count / follower_count / following_count from source tables."""
+    result = reconcile_counts()
+    print(f"Corrected counters on {result['posts']} posts and {result['users']} users")
+
+def migration_secret_error():
+    """
+    None if the request carries the migration secret (MIGRATION_SECRET) as
+    secret_key in its JSON or form body, else the 401 response to return.
+    Every migration that rewrites or rescans whole tables requires it.
+    """
+    data = (request.get_json(silent=True) if request.is_json else request.form) or {}
+    secret_key = data.get('secret_key') if hasattr(data, 'get') else None
+    if secret_key != os.environ.get('MIGRATION_SECRET', 'earshot-migration-2025'):
+        return jsonify({'error': 'Unauthorized. Secret key required.'}), 401
+    return None
+
 @app.route('/api/migrate-device-id', methods=['POST'])
 def migrate_device_id():
     """Add device_id column and make password_hash nullable."""
@@ -705,82 +3165,32 @@ def migrate_device_id():
 @app.route('/api/migrate-artists', methods=['POST'])
 def migrate_artists_endpoint():
     """
-    One-time migration endpoint to update artist names for existing posts.
+    Queue a background re-enrichment of all track metadata (see reenrich_tracks).
     Requires a secret key to prevent unauthorized access.
-    Call this once after deploying improved artist extraction logic.
+    Call this after deploying improved artist extraction logic; pass
+    {"restart": true} to start over instead of resuming from the checkpoint.
+    The same work can be run directly with `flask --app app reenrich-tracks`.
     """
-    # Simple security: require a secret key in the request
-    secret_key = request.json.get('secret_key') if request.is_json else request.form.get('secret_key')
-    expected_key = os.environ.get('MIGRATION_SECRET', 'earshot-migration-2025')
-    
-    if secret_key != expected_key:
-        return jsonify({'error': 'Unauthorized. Secret key required.'}), 401
-    
-    try:
-        posts = Post.query.all()
-        total = len(posts)
-        updated = 0
-        failed = 0
-        skipped = 0
-        results = []
-        
-        for i, post in enumerate(posts, 1):
-            try:
-                platform, info = parse_track_url(post.url)
-                
-                if not info:
-                    results.append(f"Failed to parse post #{post.id}")
-                    failed += 1
-                    continue
-                
-                new_artist = info.get('artist', 'Unknown Artist')
-                new_title = info.get('title', post.title)
-                new_thumbnail = info.get('thumbnail', post.thumbnail)
-                
-                should_update = False
-                changes = []
-                
-                if new_artist != 'Unknown Artist' and new_artist != post.artist:
-                    should_update = True
-                    changes.append(f"artist: '{post.artist}' → '{new_artist}'")
-                    post.artist = new_artist
-                
-                if new_title != post.title:
-                    should_update = True
-                    changes.append(f"title updated")
-                    post.title = new_title
-                
-                if new_thumbnail != post.thumbnail:
-                    should_update = True
-                    changes.append("thumbnail updated")
-                    post.thumbnail = new_thumbnail
-                
-                if should_update:
-                    db.session.commit()
-                    results.append(f"Updated post #{post.id}: {', '.join(changes)}")
-                    updated += 1
-                else:
-                    skipped += 1
-                    
-            except Exception as e:
-                results.append(f"Error processing post #{post.id}: {str(e)}")
-                db.session.rollback()
-                failed += 1
-                continue
-        
-        return jsonify({
-            'success': True,
-            'summary': {
-                'total': total,
-                'updated': updated,
-                'skipped': skipped,
-                'failed': failed
-            },
-            'results': results[:50]  # Limit to first 50 results to avoid huge response
-        })
-        
-    except Exception as e:
-        return jsonify({'error': f'Migration failed: {str(e)}'}), 500
+    denied = migration_secret_error()
+    if denied:
+        return denied
+
+    data = request.get_json(silent=True) or {}
+    if data.get('restart'):
+        checkpoint = db.session.get(Checkpoint, REENRICH_CHECKPOINT)
+        if checkpoint is not None:
+            checkpoint.value = '0'
+    job = enqueue_job('reenrich_tracks', {
+        'chunk_size': int(data.get('chunk_size', 200)),
+        'workers': int(data.get('workers', 8)),
+    })
+    db.session.commit()
+    wake_job_worker()
+    return jsonify({
+        'success': True,
+        'message': 'Re-enrichment queued; progress is logged by the job worker',
+        'job_id': job.id
+    }), 202
 
 @app.route('/api/migrate-crate', methods=['POST'])
 def migrate_crate():
@@ -834,6 +3244,284 @@ def migrate_crate():
             'results': results
         }), 500
 
+@app.route('/api/migrate-counters', methods=['POST'])
+def migrate_counters():
+    """
+    Add the denormalized counter columns and backfill them from crate/follow.
+    Requires the migration secret (see migration_secret_error).
+    """
+    denied = migration_secret_error()
+    if denied:
+        return denied
+    results = []
+    try:
+        ensure_columns(Post.__table__, results)
+        ensure_columns(User.__table__, results)
+        counts = reconcile_counts()
+        results.append(f"counters corrected on {counts['posts']} posts and {counts['users']} users")
+        return jsonify({
+            'success': True,
+            'message': 'Counter migration completed',
+            'results': results
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': results
+        }), 500
+
+@app.route('/api/migrate-first-discover', methods=['POST'])
+def migrate_first_discover():
+    """
+    Add post.track_key / post.is_first_discover, index track_key and backfill both.
+    Requires the migration secret (see migration_secret_error).
+    """
+    denied = migration_secret_error()
+    if denied:
+        return denied
+    results = []
+    try:
+        ensure_columns(Post.__table__, results)
+        for index in Post.__table__.indexes:
+            if 'track_key' in index.columns:
+                index.create(db.engine, checkfirst=True)
+                results.append(f'{index.name} ensured')
+
+        backfilled = 0
+        last_id = 0
+        while True:
+            rows = (
+                db.session.query(Post.id, Post.url)
+                .filter(Post.track_key.is_(None), Post.id > last_id)
+                .order_by(Post.id)
+                .limit(500)
+                .all()
+            )
+            if not rows:
+                break
+            db.session.execute(
+                db.update(Post),
+                [{'id': post_id, 'track_key': track_key_for_url(url or '')} for post_id, url in rows]
+            )
+            db.session.commit()
+            backfilled += len(rows)
+            last_id = rows[-1][0]
+        results.append(f'track_key backfilled for {backfilled} posts')
+
+        earlier = db.aliased(Post)
+        first_id = (
+            db.select(func.min(earlier.id)).where(earlier.track_key == Post.track_key)
+            .scalar_subquery()
+        )
+        lift_statement_timeout()
+        db.session.execute(db.update(Post).values(is_first_discover=(Post.id == first_id)))
+        db.session.commit()
+        results.append('is_first_discover recomputed')
+        return jsonify({
+            'success': True,
+            'message': 'First discover migration completed',
+            'results': results
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': results
+        }), 500
+
+@app.route('/api/migrate-tracks', methods=['POST'])
+def migrate_tracks():
+    """
+    Create the track table, add post.track_id and attach existing posts to shared tracks.
+    Requires the migration secret (see migration_secret_error).
+    """
+    denied = migration_secret_error()
+    if denied:
+        return denied
+    results = []
+    try:
+        Track.__table__.create(db.engine, checkfirst=True)
+        results.append('track table ensured')
+        ensure_columns(Post.__table__, results)
+        for index in Post.__table__.indexes:
+            if 'track_id' in index.columns:
+                index.create(db.engine, checkfirst=True)
+                results.append(f'{index.name} ensured')
+
+        attached, track_count, skipped = attach_posts_to_tracks()
+        results.append(f'{attached} posts attached to {track_count} tracks, {skipped} unparseable posts left as-is')
+        return jsonify({
+            'success': True,
+            'message': 'Track migration completed',
+            'results': results
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': results
+        }), 500
+
+@app.route('/api/migrate-timeline', methods=['POST'])
+def migrate_timeline():
+    """
+    Create the timeline_entry and pulled_follow tables and build every user's following timeline.
+    Requires the migration secret (see migration_secret_error).
+    """
+    denied = migration_secret_error()
+    if denied:
+        return denied
+    results = []
+    try:
+        TimelineEntry.__table__.create(db.engine, checkfirst=True)
+        results.append('timeline_entry table ensured')
+        pulled_follow.create(db.engine, checkfirst=True)
+        results.append('pulled_follow table ensured')
+        ensure_columns(User.__table__, results)
+        results.append(f'{rebuild_timelines()} timeline entries inserted')
+        return jsonify({
+            'success': True,
+            'message': 'Timeline migration completed',
+            'results': results
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': results
+        }), 500
+
+@app.route('/api/migrate-jobs', methods=['POST'])
+def migrate_jobs():
+    """Create the job and checkpoint tables and add track.status for background processing."""
+    results = []
+    try:
+        Job.__table__.create(db.engine, checkfirst=True)
+        results.append('job table ensured')
+        Checkpoint.__table__.create(db.engine, checkfirst=True)
+        results.append('checkpoint table ensured')
+        ensure_columns(Track.__table__, results)
+        return jsonify({
+            'success': True,
+            'message': 'Job migration completed',
+            'results': results
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': results
+        }), 500
+
+@app.route('/api/migrate-metadata-cache', methods=['POST'])
+def migrate_metadata_cache():
+    """Create the cache_entry table backing the shared metadata cache."""
+    try:
+        CacheEntry.__table__.create(db.engine, checkfirst=True)
+        return jsonify({
+            'success': True,
+            'message': 'Metadata cache migration completed',
+            'results': ['cache_entry table ensured']
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': []
+        }), 500
+
+@app.route('/api/migrate-events', methods=['POST'])
+def migrate_events():
+    """Create the feed_event table used by EVENT_BRIDGE=database."""
+    try:
+        FeedEvent.__table__.create(db.engine, checkfirst=True)
+        return jsonify({
+            'success': True,
+            'message': 'Event migration completed',
+            'results': ['feed_event table ensured']
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': []
+        }), 500
+
+@app.route('/api/migrate-indexes', methods=['POST'])
+def migrate_indexes():
+    """Create every model-level index (including lower(username)) that the live database is missing."""
+    results = []
+    try:
+        lift_statement_timeout()  # building an index reads the whole table
+        for table in db.metadata.sorted_tables:
+            if not inspect(db.engine).has_table(table.name):
+                continue
+            for index in table.indexes:
+                # IF NOT EXISTS rather than reflection: SQLite doesn't reflect expression indexes
+                db.session.execute(CreateIndex(index, if_not_exists=True))
+                results.append(f'{index.name} ensured')
+        db.session.commit()
+        return jsonify({
+            'success': True,
+            'message': 'Index migration completed',
+            'results': results
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': results
+        }), 500
+
+@app.route('/api/migrate-feed-index', methods=['POST'])
+def migrate_feed_index():
+    """Replace the single-column post.timestamp index with the (timestamp, id) keyset index."""
+    results = []
+    try:
+        feed_index = next(ix for ix in Post.__table__.indexes if ix.name == 'ix_post_timestamp_id')
+        feed_index.create(db.engine, checkfirst=True)
+        results.append('ix_post_timestamp_id ensured')
+        db.session.execute(text('DROP INDEX IF EXISTS ix_post_timestamp'))
+        db.session.commit()
+        results.append('old ix_post_timestamp dropped')
+        return jsonify({
+            'success': True,
+            'message': 'Feed index migration completed',
+            'results': results
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'results': results
+        }), 500
+
 # ---------- RUN ----------
 if __name__ == '__main__':
     with app.app_context():
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Write throughput of concurrent crate saves, follows and feed reads under
+each database tuning profile.
+
+Every profile runs in its own process (app.py reads its engine settings at
+import) against a freshly seeded database. Each process has --threads
+threads, each with its own app context and so its own pooled connection.
+Every thread mixes the operations behind the toggle endpoints:
+save_to_crate / remove_from_crate, User.follow / unfollow and a global
+feed read. Each operation commits on its own.
+
+Profiles:
+  sqlite   untuned:  rollback journal, synchronous=FULL, no mmap (the old defaults;
+                     busy_timeout 5000 matches sqlite3's default timeout=5.0)
+           tuned:    the app defaults (WAL, synchronous=NORMAL, busy_timeout, mmap)
+  postgres untuned:  SQLAlchemy's default pool (5 + 10 overflow), no statement timeout
+           tuned:    the app defaults (DB_POOL_SIZE etc.)
+
+SQLite runs on a temp file. Pass --database-url to run the postgres
+profiles; that database is dropped and re-created, so it must be a
+throwaway one.
+
+Usage:  python -m benchmarks.bench_db_concurrency [--threads 16] [--ops 200]
+            [--database-url postgresql://...] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    'sqlite': {
+        'untuned': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+                    'SQLITE_BUSY_TIMEOUT_MS': '5000', 'SQLITE_MMAP_SIZE': '0'},
+        'tuned': {},
+    },
+    'postgres': {
+        'untuned': {'DB_POOL_SIZE': '5', 'DB_MAX_OVERFLOW': '10', 'DB_STATEMENT_TIMEOUT_MS': '0'},
+        'tuned': {},
+    },
+}
+
+USERS = 50
+POSTS = 500
+
+
+def worker(earshot, seed_value, ops, latencies, errors):
+    from sqlalchemy.exc import OperationalError
+
+    rng = random.Random(seed_value)
+    db = earshot.db
+    with earshot.app.app_context():
+        for _ in range(ops):
+            kind = rng.choice(('crate', 'crate', 'follow', 'feed'))
+            user_id = rng.randint(1, USERS)
+            start = time.perf_counter()
+            try:
+                if kind == 'crate':
+                    post = db.session.get(earshot.Post, rng.randint(1, POSTS))
+                    if not earshot.save_to_crate(user_id, post):
+                        earshot.remove_from_crate(user_id, post)
+                elif kind == 'follow':
+                    user = db.session.get(earshot.User, user_id)
+                    other = db.session.get(earshot.User, rng.randint(1, USERS))
+                    if user.id != other.id and not user.unfollow(other):
+                        user.follow(other)
+                else:
+                    earshot.Post.query.order_by(earshot.Post.timestamp.desc()).limit(20).all()
+                db.session.commit()
+                latencies.append(time.perf_counter() - start)
+            except OperationalError as e:
+                db.session.rollback()
+                errors.append(str(e.orig).splitlines()[0])
+
+
+def run_profile(threads, ops):
+    """Child process body: seed, hammer, print one JSON line."""
+    import app as earshot
+    from benchmarks.dataset import dataset_rows, seed_dataset
+
+    with earshot.app.app_context():
+        seed_dataset(earshot, dataset_rows(users=USERS, posts_per_user=POSTS // USERS))
+    latencies, errors = [], []
+    pool = [threading.Thread(target=worker, args=(earshot, i, ops, latencies, errors)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(json.dumps({
+        'ok': len(latencies),
+        'errors': len(errors),
+        'error_kinds': sorted(set(errors)),
+        'ops_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2) if latencies else None,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Database concurrency benchmark')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=200, help='operations per thread')
+    parser.add_argument('--database-url', help='throwaway Postgres database for the postgres profiles')
+    parser.add_argument('--json', metavar='PATH', help='write results to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_profile(args.threads, args.ops)
+        return 0
+
+    backends = {'sqlite': None}
+    if args.database_url:
+        backends['postgres'] = args.database_url
+
+    results = []
+    for backend, url in backends.items():
+        for profile, overrides in PROFILES[backend].items():
+            if url is None:
+                url_for_run = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='earshot-db-'), 'bench.db')
+            else:
+                url_for_run = url
+            env = {**os.environ, **overrides, 'DATABASE_URL': url_for_run,
+                   'JOB_WORKER': 'external', 'METADATA_CACHE_STORE': 'none', 'RESPONSE_CACHE_STORE': 'none'}
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_db_concurrency', '--child',
+                 '--threads', str(args.threads), '--ops', str(args.ops)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            row = {'backend': backend, 'profile': profile, 'threads': args.threads}
+            row.update(json.loads(out.strip().splitlines()[-1]))
+            results.append(row)
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
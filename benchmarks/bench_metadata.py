@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Per-URL latency of the YouTube metadata paths in parse_track_url.
+
+By default everything runs against the local fixture server, which measures
+the oEmbed fast path with a simulated upstream latency. yt-dlp cannot be
+redirected to a fixture, so --live additionally times, against real YouTube:
+  - full:  the old yt-dlp configuration (extract_flat False, formats resolved)
+  - light: youtube_music_info (metadata-only yt-dlp, used for YouTube Music)
+  - fast:  the oEmbed path parse_track_url now takes for regular videos
+
+Usage:  python -m benchmarks.bench_metadata [--iterations 50] [--latency 0.05] [--live URL]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'earshot-bench.db'))
+os.environ.setdefault('METADATA_CACHE_STORE', 'none')
+
+import yt_dlp  # noqa: E402
+
+import app as earshot  # noqa: E402
+from benchmarks.fixture_server import start_fixture_server, point_app_at  # noqa: E402
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 2),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+    }
+
+
+def time_calls(fn, urls):
+    samples = []
+    for url in urls:
+        start = time.perf_counter()
+        fn(url)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def full_ytdlp(url):
+    """The configuration parse_track_url used before the fast path."""
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'extract_flat': False}) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='YouTube metadata path benchmark')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated upstream latency (s)')
+    parser.add_argument('--live', metavar='URL', help='also time yt-dlp full/light extraction on this real URL')
+    parser.add_argument('--live-iterations', type=int, default=3)
+    parser.add_argument('--json', metavar='PATH', help='write results to this file')
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(latency=args.latency)
+    point_app_at(earshot, base_url)
+    urls = [f'https://www.youtube.com/watch?v=fixture{i:05d}' for i in range(args.iterations)]
+
+    results = {'fixture_latency_s': args.latency, 'fixture': {}}
+    results['fixture']['fast_oembed'] = time_calls(earshot.parse_track_url, urls)
+    results['fixture']['upstream_requests'] = server.request_count
+
+    if args.live:
+        live_urls = [args.live] * args.live_iterations
+        earshot.YOUTUBE_OEMBED_URL = 'https://www.youtube.com/oembed'  # real oEmbed for a fair comparison
+        results['live'] = {
+            'full_ytdlp': time_calls(full_ytdlp, live_urls),
+            'light_ytdlp': time_calls(earshot.youtube_music_info, live_urls),
+            'fast_oembed': time_calls(earshot.parse_track_url, live_urls),
+        }
+
+    server.shutdown()
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Payload size and serialization time of /api/feed items.
+
+Builds in-memory feeds (no database) from the shared benchmark dataset,
+where songs are reposted as in production, then times serialize_feed plus
+JSON encoding for each combination of:
+  - shape:   flat (default response) / normalized (users and tracks side tables)
+  - fields:  all / a card-sized subset
+  - encoder: stdlib (Flask's default provider) / orjson (when installed)
+
+Usage:  python -m benchmarks.bench_serialization [--sizes 100 1000] [--iterations 50] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'earshot-bench.db'))
+os.environ.setdefault('METADATA_CACHE_STORE', 'none')
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import app as earshot  # noqa: E402
+from benchmarks.dataset import build_posts, dataset_rows  # noqa: E402
+
+CARD_FIELDS = ('id', 'username', 'title', 'artist', 'thumbnail')
+
+
+def make_posts(n, users=50):
+    """n transient posts, newest first, from the shared benchmark dataset (reposted songs, some saves)."""
+    rows = dataset_rows(users=users, posts_per_user=-(-n // users), saves_per_user=n // 10, now=datetime(2025, 6, 1))
+    return build_posts(earshot, rows)[:n]
+
+
+def time_encoding(provider, posts, fields, shape, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        # Compact separators, as Flask's response() uses outside debug mode
+        body = provider.dumps(earshot.serialize_feed(posts, fields, shape), separators=(',', ':'))
+        samples.append(time.perf_counter() - start)
+    return {
+        'bytes': len(body.encode()),
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(sorted(samples)[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Feed serialization benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--json', metavar='PATH', help='write results to this file')
+    args = parser.parse_args()
+
+    encoders = {'stdlib': DefaultJSONProvider(earshot.app)}
+    if earshot.orjson is not None:
+        encoders['orjson'] = earshot.OrjsonProvider(earshot.app)
+
+    results = []
+    with earshot.app.app_context():
+        for size in args.sizes:
+            posts = make_posts(size)
+            for shape in ('flat', 'normalized'):
+                for fields_name, fields in (('all', tuple(earshot.FEED_ITEM_FIELDS)), ('card', CARD_FIELDS)):
+                    for encoder_name, provider in encoders.items():
+                        row = {'items': size, 'shape': shape, 'fields': fields_name, 'encoder': encoder_name}
+                        row.update(time_encoding(provider, posts, fields, shape, args.iterations))
+                        results.append(row)
+
+    print(f"{'items':>6} {'shape':<11} {'fields':<6} {'encoder':<7} {'bytes':>9} {'median ms':>10} {'p95 ms':>8}")
+    for row in results:
+        print(f"{row['items']:>6} {row['shape']:<11} {row['fields']:<6} {row['encoder']:<7} "
+              f"{row['bytes']:>9} {row['median_ms']:>10} {row['p95_ms']:>8}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
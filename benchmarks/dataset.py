@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+The synthetic dataset every benchmark runs against.
+
+dataset_rows builds deterministic rows for users, tracks, posts, follows and
+crate saves. As on the real feed, songs are reposted and posts are spread
+over all accounts. Ids are explicit and the denormalized counters are
+filled in, so the rows can be used in two ways:
+  - seed_dataset bulk-inserts them into app.py's database (replacing it)
+  - build_posts turns them into transient models, for benchmarks that
+    don't touch a database
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+
+def dataset_rows(users=10, posts_per_user=20, follows_per_user=0, saves_per_user=0, repost_ratio=4, seed=1, now=None):
+    """Row dicts per table: {'users', 'tracks', 'posts', 'follows', 'saves'}. Post ids grow with timestamp."""
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    user_rows = [
+        {'id': i + 1, 'username': f'listener_{i}', 'follower_count': 0, 'following_count': 0}
+        for i in range(users)
+    ]
+    total_posts = users * posts_per_user
+    total_tracks = max(1, total_posts // repost_ratio)
+    track_rows = [
+        {
+            'id': i + 1,
+            'platform': 'spotify',
+            'native_id': f'{i:022d}',
+            'title': f'A Reasonably Long Song Title Number {i}',
+            'artist': f'Some Artist Name {i % 997}',
+            'thumbnail': f'https://i.scdn.co/image/ab67616d0000b273{i:024x}',
+            'embed_url': f'https://open.spotify.com/embed/track/{i:022d}',
+            'status': 'ready',
+        }
+        for i in range(total_tracks)
+    ]
+
+    post_rows = []
+    seen_tracks = set()
+    for i in range(total_posts):
+        track = track_rows[rng.randrange(total_tracks)]
+        post_rows.append({
+            'id': i + 1,
+            'user_id': i % users + 1,
+            'platform': 'spotify',
+            'url': f"https://open.spotify.com/track/{track['native_id']}?si=seed{i}",
+            'track_id': track['id'],
+            'track_key': f"spotify:{track['native_id']}",
+            'is_first_discover': track['id'] not in seen_tracks,
+            'timestamp': now - timedelta(seconds=total_posts - i),
+            'save_count': 0,
+        })
+        seen_tracks.add(track['id'])
+
+    follows, saves = [], []
+    for user in user_rows:
+        candidates = rng.sample(range(1, users + 1), min(follows_per_user + 1, users))
+        for followed_id in [c for c in candidates if c != user['id']][:follows_per_user]:
+            follows.append({'follower_id': user['id'], 'followed_id': followed_id})
+            user['following_count'] += 1
+            user_rows[followed_id - 1]['follower_count'] += 1
+        for post_id in rng.sample(range(1, total_posts + 1), min(saves_per_user, total_posts)):
+            saves.append({'user_id': user['id'], 'post_id': post_id, 'saved_at': now - timedelta(seconds=rng.randrange(86400))})
+            post_rows[post_id - 1]['save_count'] += 1
+
+    return {'users': user_rows, 'tracks': track_rows, 'posts': post_rows, 'follows': follows, 'saves': saves}
+
+
+def seed_dataset(earshot, rows):
+    """Drop and re-create app.py's tables, bulk-insert `rows`, build timelines. Needs an app context."""
+    db = earshot.db
+    db.drop_all()
+    db.create_all()
+    for model, key in ((earshot.User, 'users'), (earshot.Track, 'tracks'), (earshot.Post, 'posts')):
+        if rows[key]:
+            db.session.execute(db.insert(model), rows[key])
+    if rows['follows']:
+        db.session.execute(earshot.follow.insert(), rows['follows'])
+    if rows['saves']:
+        db.session.execute(earshot.crate.insert(), rows['saves'])
+    if db.engine.dialect.name == 'postgresql':
+        # Explicit ids don't advance the serial sequences; move them past the seeded rows
+        for model in (earshot.User, earshot.Track, earshot.Post):
+            table = db.engine.dialect.identifier_preparer.format_table(model.__table__)
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+            ))
+    db.session.commit()
+    earshot.rebuild_timelines()
+    return rows
+
+
+def access_tokens(user_ids):
+    """JWT access tokens for these user ids. Needs an app context."""
+    from flask_jwt_extended import create_access_token
+
+    return [create_access_token(identity=str(user_id)) for user_id in user_ids]
+
+
+def build_posts(earshot, rows):
+    """Transient Post objects with author and track attached, newest first, as a feed page holds them."""
+    users = {row['id']: earshot.User(**row) for row in rows['users']}
+    tracks = {row['id']: earshot.Track(**row) for row in rows['tracks']}
+    posts = []
+    for row in reversed(rows['posts']):
+        post = earshot.Post(**row)
+        post.author = users[row['user_id']]
+        post.track = tracks[row['track_id']]
+        posts.append(post)
+    return posts
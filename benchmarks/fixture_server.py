@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Spotify / YouTube oEmbed and iTunes lookup APIs.
+
+Benchmarks point app.py's provider endpoints at this server so they measure
+our code (plus a configurable simulated upstream latency) instead of the
+public internet.
+
+Run standalone:  python -m benchmarks.fixture_server --port 8765 --latency 0.05
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    latency = 0.0  # seconds added to every response, set per server
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real providers
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.request_count += 1
+
+        if parsed.path == '/spotify/oembed':
+            track_id = params.get('url', '').rstrip('/').split('/')[-1].split('?')[0]
+            body = {
+                'title': f'Fixture Song {track_id} · Fixture Artist',
+                'thumbnail_url': f'https://i.scdn.co/image/{track_id}',
+            }
+        elif parsed.path == '/youtube/oembed':
+            video_id = params.get('url', '').split('v=')[-1]
+            body = {
+                'title': f'Fixture Video {video_id}',
+                'author_name': 'Fixture Channel',
+                'thumbnail_url': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
+            }
+        elif parsed.path == '/itunes/lookup':
+            song_id = params.get('id', '0')
+            body = {
+                'resultCount': 1,
+                'results': [{
+                    'trackName': f'Fixture Song {song_id}',
+                    'artistName': 'Fixture Artist',
+                    'artworkUrl100': f'https://is1-ssl.mzstatic.com/{song_id}/100x100bb.jpg',
+                }],
+            }
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+
+def start_fixture_server(port=0, latency=0.0):
+    """Start the fixture server in a daemon thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FixtureHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.request_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def point_app_at(app_module, base_url):
+    """Redirect app.py's provider endpoints to a running fixture server."""
+    app_module.SPOTIFY_OEMBED_URL = f'{base_url}/spotify/oembed'
+    app_module.YOUTUBE_OEMBED_URL = f'{base_url}/youtube/oembed'
+    app_module.ITUNES_LOOKUP_URL = f'{base_url}/itunes/lookup'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated upstream latency in seconds')
+    args = parser.parse_args()
+    server, base_url = start_fixture_server(args.port, args.latency)
+    print(f'Fixture server on {base_url} (latency {args.latency}s). Ctrl+C to stop.')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
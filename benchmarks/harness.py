@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Latency, throughput and SQL statements per request for the main API routes,
+against a seeded dataset, with results saved as JSON for regression checks.
+
+Seeds users, tracks, posts, follows and crate saves at the requested scale
+(benchmarks.dataset, shared with the other benchmarks). It then drives
+each scenario through Flask's test client in two phases:
+  - sequential: --requests calls for latency percentiles and the median
+    number of SQL statements per request
+  - concurrent: the same number of calls from --concurrency threads,
+    for throughput
+
+Provider lookups for /api/post go to the local fixture server. After the
+post scenario, the queued enrich jobs are drained and timed.
+
+SQLite runs on a temp file by default. --database-url points at Postgres
+(or another SQLite file); that database is dropped and re-created, so it
+must be a throwaway one.
+
+Usage:  python -m benchmarks.harness [--users 1000] [--posts-per-user 20]
+            [--follows-per-user 50] [--saves-per-user 20] [--requests 200]
+            [--concurrency 8] [--scenarios feed_global profile ...]
+            [--no-response-cache] [--json PATH] [--compare BASELINE.json]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ('feed_global', 'feed_following', 'profile', 'profile_crate', 'crate_toggle', 'follow_toggle', 'post')
+TOKEN_USERS = 100  # requests are spread over this many callers
+
+
+def percentile(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * q))]
+
+
+def request_factory(name, usernames, user_ids, post_ids, tokens):
+    """Return f(i) -> (method, path, json body, token) for the i-th call of a scenario."""
+    post_counter = itertools.count()
+
+    def feed_global(i):
+        return 'get', '/api/feed', None, tokens[i % len(tokens)]
+
+    def feed_following(i):
+        return 'get', '/api/feed?type=following', None, tokens[i % len(tokens)]
+
+    def profile(i):
+        return 'get', f'/api/profile/{usernames[(i * 7919) % len(usernames)]}', None, tokens[i % len(tokens)]
+
+    def profile_crate(i):
+        return 'get', f'/api/profile/{usernames[(i * 7919) % len(usernames)]}/crate', None, tokens[i % len(tokens)]
+
+    def crate_toggle(i):
+        # Pairs of save/unsave of the same post by the same caller, so the dataset ends where it started
+        pair = i // 2
+        method = 'post' if i % 2 == 0 else 'delete'
+        return method, f'/api/crate/{post_ids[(pair * 104729) % len(post_ids)]}', None, tokens[pair % len(tokens)]
+
+    def follow_toggle(i):
+        pair = i // 2
+        return 'post', f'/api/follow/{user_ids[(pair * 7919 + 1) % len(user_ids)]}', None, tokens[pair % len(tokens)]
+
+    def post(i):
+        url = f'https://open.spotify.com/track/bench{next(post_counter):017d}'
+        return 'post', '/api/post', {'url': url}, tokens[i % len(tokens)]
+
+    return locals()[name]
+
+
+def run_scenario(earshot, name, make_request, args, statement_counter):
+    """Sequential phase (latency, statements), then concurrent phase (throughput)."""
+    client = earshot.app.test_client()
+    latencies, statements, errors = [], [], 0
+    for i in range(args.requests):
+        method, path, body, token = make_request(i)
+        statement_counter.count = 0
+        start = time.perf_counter()
+        response = getattr(client, method)(path, json=body, headers={'Authorization': f'Bearer {token}'})
+        latencies.append(time.perf_counter() - start)
+        statements.append(statement_counter.count)
+        errors += response.status_code >= 400
+
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'client'):
+            local.client = earshot.app.test_client()
+        method, path, body, token = make_request(args.requests + i)
+        return getattr(local.client, method)(path, json=body, headers={'Authorization': f'Bearer {token}'}).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(call, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    errors += sum(status >= 400 for status in statuses)
+
+    latencies.sort()
+    return {
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'throughput_rps': round(len(statuses) / elapsed, 1),
+        'queries': statistics.median(statements),
+        'errors': errors,
+    }
+
+
+def drain_jobs(earshot):
+    """Run the queued jobs (enrichment against the fixture server); returns seconds taken."""
+    start = time.perf_counter()
+    with earshot.app.app_context():
+        earshot.run_job_worker(once=True)
+    return round(time.perf_counter() - start, 2)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold):
+    """Print per-scenario deltas; returns the list of regressions beyond threshold."""
+    regressions = []
+    print(f"\n{'scenario':<15} {'p50 ms':>17} {'p95 ms':>17} {'req/s':>17} {'queries':>11}")
+    for name, now in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            print(f'{name:<15} (not in baseline)')
+            continue
+
+        def cell(key, worse_if_higher):
+            old, new = before[key], now[key]
+            change = (new - old) / old if old else 0.0
+            if (change > threshold) if worse_if_higher else (change < -threshold):
+                regressions.append(f'{name} {key}: {old} -> {new}')
+                flag = '!'
+            else:
+                flag = ' '
+            return f'{old:>6}->{new:<6}{change:+.0%}{flag}'
+
+        queries = f"{before['queries']}->{now['queries']}"
+        if now['queries'] > before['queries']:
+            regressions.append(f"{name} queries: {queries}")
+            queries += '!'
+        print(f"{name:<15} {cell('p50_ms', True):>17} {cell('p95_ms', True):>17} "
+              f"{cell('throughput_rps', False):>17} {queries:>11}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API benchmark harness')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts-per-user', type=int, default=20)
+    parser.add_argument('--follows-per-user', type=int, default=50)
+    parser.add_argument('--saves-per-user', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200, help='calls per scenario and phase')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated upstream latency (s)')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--database-url', help='throwaway database to seed (default: a temp SQLite file)')
+    parser.add_argument('--no-response-cache', action='store_true', help='run with RESPONSE_CACHE_TTL=0')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', metavar='PATH', help='write results to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare with an earlier --json result')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change reported as a regression')
+    args = parser.parse_args()
+
+    # app.py reads these at import
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='earshot-harness-'), 'harness.db')
+    os.environ['JOB_WORKER'] = 'external'  # jobs are drained explicitly, outside the timed phases
+    os.environ.setdefault('METADATA_CACHE_STORE', 'none')
+    if args.no_response_cache:
+        os.environ['RESPONSE_CACHE_TTL'] = '0'
+
+    from sqlalchemy import event
+
+    import app as earshot
+    from benchmarks.dataset import access_tokens, dataset_rows, seed_dataset
+    from benchmarks.fixture_server import start_fixture_server, point_app_at
+
+    server, base_url = start_fixture_server(latency=args.latency)
+    point_app_at(earshot, base_url)
+
+    rows = dataset_rows(
+        users=args.users, posts_per_user=args.posts_per_user, follows_per_user=args.follows_per_user,
+        saves_per_user=args.saves_per_user, seed=args.seed,
+    )
+    usernames = [row['username'] for row in rows['users']]
+    user_ids = [row['id'] for row in rows['users']]
+    post_ids = [row['id'] for row in rows['posts']]
+    start = time.perf_counter()
+    with earshot.app.app_context():
+        seed_dataset(earshot, rows)
+        tokens = access_tokens(user_ids[:TOKEN_USERS])
+        engine = earshot.db.engine
+    seed_seconds = round(time.perf_counter() - start, 1)
+
+    statement_counter = threading.local()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_statement(*_):
+        statement_counter.count = getattr(statement_counter, 'count', 0) + 1
+
+    results = {
+        'revision': git_revision(),
+        'backend': engine.dialect.name,
+        'dataset': {
+            'users': args.users,
+            'posts': len(post_ids),
+            'follows_per_user': args.follows_per_user,
+            'saves_per_user': args.saves_per_user,
+        },
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'response_cache': not args.no_response_cache,
+        'seed_seconds': seed_seconds,
+        'scenarios': {},
+    }
+    for name in args.scenarios:
+        make_request = request_factory(name, usernames, user_ids, post_ids, tokens)
+        results['scenarios'][name] = run_scenario(earshot, name, make_request, args, statement_counter)
+        if name == 'post':
+            results['scenarios'][name]['enrich_seconds'] = drain_jobs(earshot)
+            results['scenarios'][name]['upstream_requests'] = server.request_count
+    server.shutdown()
+
+    print(f"{results['backend']}, {len(user_ids)} users, {len(post_ids)} posts, seeded in {seed_seconds}s")
+    print(f"{'scenario':<15} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8} {'errors':>7}")
+    for name, row in results['scenarios'].items():
+        print(f"{name:<15} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+              f"{row['throughput_rps']:>8} {row['queries']:>8} {row['errors']:>7}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print('\nRegressions:\n  ' + '\n  '.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Concurrent POST /api/post load test against a real gunicorn server.
+
+For each requested gunicorn worker class the app is started as a
+subprocess (gunicorn -c gunicorn.conf.py) on a fresh SQLite database, with
+every provider endpoint pointed at the local fixture server, which adds a
+simulated upstream latency. The loader then posts unique Spotify links from
+--concurrency client threads and reports:
+  - accept throughput and latency of /api/post (metadata is fetched later)
+  - drain time: until the background jobs have enriched every track, which
+    is where the upstream latency and JOB_CONCURRENCY show up
+
+Usage:  python -m benchmarks.load_post [--classes sync gthread] [--requests 300]
+            [--concurrency 32] [--latency 0.2] [--job-concurrency 8] [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fixture_server import start_fixture_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            requests.get(base_url + '/api/post/0', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def seed_database(db_path, users):
+    """Create the schema and users in a child process (app.py reads DATABASE_URL at import). Returns tokens."""
+    script = (
+        "import json, app\n"
+        "from benchmarks.dataset import access_tokens, dataset_rows, seed_dataset\n"
+        "with app.app.app_context():\n"
+        f"    rows = seed_dataset(app, dataset_rows(users={users}, posts_per_user=0))\n"
+        "    print(json.dumps(access_tokens([row['id'] for row in rows['users']])))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, '-c', script], cwd=ROOT, check=True, capture_output=True, text=True,
+        env={**os.environ, 'DATABASE_URL': f'sqlite:///{db_path}', 'JOB_WORKER': 'external'},
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def pending_tracks(db_path):
+    import sqlite3
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT count(*) FROM track WHERE status = 'pending'").fetchone()[0]
+
+
+def run_class(worker_class, args, fixture_url):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='earshot-load-'), 'load.db')
+    tokens = seed_database(db_path, users=20)
+    port = free_port()
+    env = {
+        **os.environ,
+        'DATABASE_URL': f'sqlite:///{db_path}',
+        'METADATA_CACHE_STORE': 'none',
+        'SPOTIFY_OEMBED_URL': f'{fixture_url}/spotify/oembed',
+        'YOUTUBE_OEMBED_URL': f'{fixture_url}/youtube/oembed',
+        'ITUNES_LOOKUP_URL': f'{fixture_url}/itunes/lookup',
+        'JOB_CONCURRENCY': str(args.job_concurrency),
+        'GUNICORN_WORKER_CLASS': worker_class,
+    }
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(base_url, proc)
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+        def post(i):
+            start = time.perf_counter()
+            r = session.post(
+                base_url + '/api/post',
+                json={'url': f'https://open.spotify.com/track/load{worker_class}{i:06d}'},
+                headers={'Authorization': f'Bearer {tokens[i % len(tokens)]}'},
+                timeout=60,
+            )
+            return time.perf_counter() - start, r.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(post, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        drain_start = time.perf_counter()
+        while pending_tracks(db_path) and time.perf_counter() - drain_start < args.drain_timeout:
+            time.sleep(0.1)
+        drain = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, status in results if status in (200, 202))
+        return {
+            'worker_class': worker_class,
+            'requests': args.requests,
+            'ok': len(latencies),
+            'errors': len(results) - len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1) if latencies else None,
+            'all_enriched_after_s': round(drain, 2),
+            'still_pending': pending_tracks(db_path),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent /api/post load test')
+    parser.add_argument('--classes', nargs='+', default=['sync', 'gthread'], help='gunicorn worker classes to compare')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.2, help='simulated upstream latency (s)')
+    parser.add_argument('--job-concurrency', type=int, default=8)
+    parser.add_argument('--drain-timeout', type=float, default=120)
+    parser.add_argument('--json', metavar='PATH', help='write results to this file')
+    args = parser.parse_args()
+
+    server, fixture_url = start_fixture_server(latency=args.latency)
+    results = [run_class(worker_class, args, fixture_url) for worker_class in args.classes]
+    server.shutdown()
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+SQL statements per request for the authenticated API routes, with the
+identity cache off (IDENTITY_CACHE_TTL=0, the default) and on.
+
+Seeds a throwaway SQLite database, then calls each route through Flask's
+test client and counts statements with a SQLAlchemy before_cursor_execute
+listener. GET routes are called once to warm up before being measured;
+writes run in order, so each toggle is measured in both directions. The
+"on" column is the steady state once the caller's row is cached.
+
+Usage:  python -m benchmarks.query_counts [--json PATH]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'earshot-query-counts.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+os.environ.setdefault('METADATA_CACHE_STORE', 'none')
+os.environ.setdefault('JOB_WORKER', 'external')
+
+from sqlalchemy import event  # noqa: E402
+
+import app as earshot  # noqa: E402
+from benchmarks.dataset import access_tokens, dataset_rows, seed_dataset  # noqa: E402
+
+# (label, method, path, json body), run in this order
+ROUTES = [
+    ('feed global', 'get', '/api/feed', None),
+    ('feed following', 'get', '/api/feed?type=following', None),
+    ('me', 'get', '/api/me', None),
+    ('profile (viewer)', 'get', '/api/profile/listener_1', None),
+    ('crate save', 'post', '/api/crate/2', None),
+    ('crate unsave', 'delete', '/api/crate/2', None),
+    ('follow toggle', 'post', '/api/follow/3', None),
+    ('follow toggle back', 'post', '/api/follow/3', None),
+    ('crate batch', 'post', '/api/crate/batch', {'save': [3, 4], 'unsave': [5]}),
+]
+
+
+def seed():
+    rows = seed_dataset(earshot, dataset_rows(users=10, posts_per_user=20))
+    return access_tokens([rows['users'][0]['id']])[0]
+
+
+def measure(client, headers, statements):
+    counts = {}
+    for label, method, path, body in ROUTES:
+        call = getattr(client, method)
+        if method == 'get':
+            call(path, headers=headers)  # warm the response cache so both columns measure the same path
+        statements.clear()
+        call(path, headers=headers, json=body)
+        counts[label] = len(statements)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-route SQL statement counts')
+    parser.add_argument('--json', metavar='PATH', help='write results to this file')
+    args = parser.parse_args()
+
+    statements = []
+    with earshot.app.app_context():
+        event.listen(earshot.db.engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+    client = earshot.app.test_client()
+
+    results = {}
+    for ttl in (0, 60):
+        # Seed in its own context, so every request gets a fresh session like in production
+        with earshot.app.app_context():
+            headers = {'Authorization': f'Bearer {seed()}'}
+        earshot.IDENTITY_CACHE_TTL = ttl
+        earshot.identity_cache = earshot.LRUCache()
+        client.get('/api/me', headers=headers)  # loads the caller (into the cache when it's on)
+        results['cache_on' if ttl else 'cache_off'] = measure(client, headers, statements)
+
+    print(f"{'route':<20} {'cache off':>9} {'cache on':>9}")
+    for label, *_ in ROUTES:
+        print(f"{label:<20} {results['cache_off'][label]:>9} {results['cache_on'][label]:>9}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    os.remove(DB_PATH)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Gunicorn settings, read automatically by `gunicorn app:app` (see procfile).
+
+The default sync worker handles one request at a time, so a single
+/api/stream client or slow request would tie up a whole process. Two
+concurrent modes are supported, chosen with GUNICORN_WORKER_CLASS:
+
+  gthread  (default) GUNICORN_THREADS request threads per worker. No extra
+           dependencies; every blocking call (DB, providers) holds one thread.
+  gevent   Cooperative greenlets, GUNICORN_WORKER_CONNECTIONS per worker.
+           Needs `pip install gevent`; the worker monkey-patches sockets, so
+           requests and the DB driver yield while waiting on the network.
+
+Each open /api/stream holds a thread (gthread) or a greenlet (gevent) for
+as long as it stays connected. SSE_MAX_SUBSCRIBERS caps streams per worker
+(further clients get 503 + Retry-After). Unless set, it defaults to half of
+the worker's threads or connections (none on the sync worker), so streams
+can never starve ordinary requests. Prefer gevent when many clients stream.
+
+Worker processes come from WEB_CONCURRENCY (gunicorn's own default is 1).
+With more than one, set EVENT_BRIDGE=database so SSE clients on every
+worker see every write.
+"""
+
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 200))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Read by app.py in each worker (forked after this file runs)
+if worker_class == 'gthread':
+    _stream_slots = threads // 2
+elif worker_class in ('gevent', 'eventlet'):
+    _stream_slots = worker_connections // 2
+else:
+    _stream_slots = 0  # a sync worker would be blocked outright by a single stream
+os.environ.setdefault('SSE_MAX_SUBSCRIBERS', str(_stream_slots))
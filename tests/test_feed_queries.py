@@ -0,0 +1,72 @@
+"""
+/api/feed must cost a fixed number of SQL statements, whatever the page size
+(no per-post save-count or author queries).
+"""
+
+import os
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='earshot-test-'), 'feed.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+os.environ['JOB_WORKER'] = 'external'
+os.environ['METADATA_CACHE_STORE'] = 'none'
+os.environ['RESPONSE_CACHE_TTL'] = '0'  # measure the database path, not a cached body
+
+import pytest  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import app as earshot  # noqa: E402
+
+
+def seed(posts):
+    """`posts` posts by as many distinct authors, each saved and followed by the viewer. Returns the viewer's token."""
+    db = earshot.db
+    db.drop_all()
+    db.create_all()
+    viewer = earshot.User(username='viewer')
+    authors = [earshot.User(username=f'author_{i}') for i in range(posts)]
+    db.session.add_all([viewer, *authors])
+    db.session.flush()
+    for i, author in enumerate(authors):
+        track = earshot.Track(platform='spotify', native_id=f'{i:022d}', title=f'Song {i}', artist='Artist')
+        post = earshot.Post(
+            user_id=author.id,
+            platform='spotify',
+            url=f'https://open.spotify.com/track/{i:022d}',
+            track_key=f'spotify:{i:022d}',
+            track=track,
+        )
+        db.session.add(post)
+        db.session.flush()
+        earshot.save_to_crate(viewer.id, post)
+        viewer.follow(author)
+    db.session.commit()
+    earshot.rebuild_timelines()
+    return create_access_token(identity=str(viewer.id))
+
+
+def feed_statements(query_string, posts):
+    with earshot.app.app_context():
+        token = seed(posts)
+        engine = earshot.db.engine
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = earshot.app.test_client().get(
+            f'/api/feed{query_string}', headers={'Authorization': f'Bearer {token}'}
+        )
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    assert len(response.get_json()) == posts
+    return len(statements)
+
+
+@pytest.mark.parametrize('query_string', ['', '?type=following'])
+def test_feed_query_count_is_constant(query_string):
+    assert feed_statements(query_string, 3) == feed_statements(query_string, 40)
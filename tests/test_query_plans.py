@@ -0,0 +1,114 @@
+"""
+Hot queries must be index-served: the patterns listed in app.hot_queries,
+and the statements the endpoints actually send (with their author/track
+joins and subqueries), each run through SQLite's EXPLAIN QUERY PLAN.
+"""
+
+import os
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='earshot-test-'), 'plans.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_PATH
+os.environ['JOB_WORKER'] = 'external'
+os.environ['METADATA_CACHE_STORE'] = 'none'
+os.environ['RESPONSE_CACHE_TTL'] = '0'  # every call reaches the database
+
+import pytest  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import app as earshot  # noqa: E402
+
+AUTHORS = 4
+# Seeded ids: the viewer is user 1, authors are users 2.., author i's post is post i + 1,
+# and the viewer's repost of the first song is post AUTHORS + 1
+ENDPOINTS = [
+    ('get', '/api/feed', None),
+    ('get', '/api/feed?type=following', None),
+    ('get', '/api/feed?type=following&fields=id,title&shape=normalized', None),
+    ('get', '/api/post/1', None),
+    ('get', '/api/profile/author_0', None),
+    ('get', '/api/profile/viewer/posts', None),
+    ('get', '/api/profile/viewer/crate', None),
+    ('get', '/api/me', None),
+    ('post', '/api/post', {'url': 'https://open.spotify.com/track/0000000000000000000000'}),
+    ('post', '/api/crate/2', None),
+    ('delete', '/api/crate/1', None),
+    ('post', '/api/crate/batch', {'save': [2, 3], 'unsave': [1]}),
+    ('post', '/api/follow/2', None),
+    ('post', '/api/follow/batch', {'follow': [], 'unfollow': [3, 4]}),
+    ('delete', f'/api/post/{AUTHORS + 1}', None),
+]
+
+
+def test_hot_queries_use_indexes():
+    failures = [(name, plan) for name, ok, plan in earshot.check_query_plans() if not ok]
+    assert failures == []
+
+
+def seed():
+    """
+    A viewer following and saving a post of each author, and reposting the
+    first song; the last author is above FANOUT_FOLLOWER_LIMIT, so the
+    following feed pulls them. Returns the viewer's token.
+    """
+    db = earshot.db
+    db.drop_all()
+    db.create_all()
+    viewer = earshot.User(username='viewer')
+    authors = [earshot.User(username=f'author_{i}') for i in range(AUTHORS)]
+    db.session.add_all([viewer, *authors])
+    db.session.flush()
+    for i, author in enumerate(authors):
+        track = earshot.Track(platform='spotify', native_id=f'{i:022d}', title=f'Song {i}', artist='Artist')
+        post = earshot.Post(
+            user_id=author.id,
+            platform='spotify',
+            url=f'https://open.spotify.com/track/{i:022d}',
+            track_key=f'spotify:{i:022d}',
+            track=track,
+        )
+        db.session.add(post)
+        db.session.flush()
+        earshot.save_to_crate(viewer.id, post)
+        viewer.follow(author)
+    db.session.add(earshot.Post(
+        user_id=viewer.id,
+        platform='spotify',
+        url=f'https://open.spotify.com/track/{0:022d}?si=repost',
+        track_key=f'spotify:{0:022d}',
+        track_id=1,
+    ))
+    authors[-1].follower_count = earshot.FANOUT_FOLLOWER_LIMIT + 1
+    db.session.commit()
+    earshot.rebuild_timelines()
+    return create_access_token(identity=str(viewer.id))
+
+
+@pytest.mark.parametrize('method, path, body', ENDPOINTS)
+def test_endpoint_statements_use_indexes(method, path, body):
+    with earshot.app.app_context():
+        token = seed()
+        engine = earshot.db.engine
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = getattr(earshot.app.test_client(), method)(
+            path, json=body, headers={'Authorization': f'Bearer {token}'}
+        )
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    assert statements
+
+    failures = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            scans = earshot.full_table_scans(statement, earshot.query_plan(conn, statement, parameters))
+            if scans:
+                failures.append((' '.join(statement.split()), scans))
+    assert failures == []